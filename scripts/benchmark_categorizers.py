@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Categorizer Benchmark
+
+Measures categorization throughput on synthetic fleets. Fleets are drawn
+from the real site exports in backend/sitesData: each synthetic device copies
+the hostname, type, OS, model (the description where an export has no model
+column) and CPU of a randomly chosen real device (so their joint distribution
+is preserved), with a numeric suffix appended to the hostname.
+
+Each stage is timed separately per fleet size:
+  - categorize_by_cpu (categorize_devices.py)
+  - categorize_device (categorize_by_cpu.py)
+  - categorize_device_strict (fix_server_counts.py)
+  - CSV export and JSON summary (fix_server_counts.py)
+
+Every stage of every fleet size runs in a fresh spawned process that builds
+its own fleet, so memo caches start cold and the peak RSS reported for a
+stage is not inherited from earlier stages or sizes. Results (devices/sec,
+peak RSS, and the RSS right before the stage, after the fleet was built) are
+written as JSON so they can be compared between commits.
+
+Usage:
+  python benchmark_categorizers.py [--sizes 10000,100000,1000000] [--seed N]
+                                   [--sites-dir DIR] [--output FILE]
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+
+import categorize_devices
+import categorize_by_cpu
+import fix_server_counts
+from device_records import DeviceRecord
+from site_exports import SITES_DATA_DIR, stream_site_exports
+
+DEFAULT_SIZES = [10000, 100000, 1000000]
+DEFAULT_OUTPUT = 'benchmark_results.json'
+
+STAGES = ['categorize_by_cpu', 'categorize_device', 'categorize_device_strict', 'csv_export', 'json_summary']
+
+
+def load_site_devices(sites_dir=SITES_DATA_DIR):
+    """Read every site export as DeviceRecords"""
+    return list(stream_site_exports(sites_dir, workers=1))
+
+
+def generate_fleet(site_devices, size, seed=0):
+    """Build `size` synthetic DeviceRecords sampled from the real site devices"""
+    rng = random.Random(seed)
+    fleet = []
+    for index, device in enumerate(rng.choices(site_devices, k=size)):
+        fleet.append(DeviceRecord(
+            id=index,
+            hostname=f"{device.hostname or 'device'}-{index}",
+            model=device.model or device.description,
+            device_type=device.device_type,
+            cpu=device.cpu,
+            os=device.os,
+            serial=f"{device.serial or 'SN'}-{index}",
+            site=device.site,
+            source_table='benchmark_device_inventory'
+        ))
+    return fleet
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def time_stage(name, size, function, baseline_rss_mb):
+    """Run one stage and return its result row"""
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    result = {
+        'size': size,
+        'stage': name,
+        'seconds': round(seconds, 4),
+        'devices_per_sec': round(size / seconds) if seconds > 0 else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'baseline_rss_mb': round(baseline_rss_mb, 1)
+    }
+    print(f"{name:>26} {size:>9} devices: {seconds:8.3f}s  "
+          f"{result['devices_per_sec'] or 0:>10} devices/sec  {result['peak_rss_mb']:8.1f} MB peak RSS "
+          f"({result['baseline_rss_mb']:.1f} MB before the stage)", flush=True)
+    return result
+
+
+def stage_function(name, fleet, workdir):
+    """The work timed for one stage"""
+    categorizers = {
+        'categorize_by_cpu': categorize_devices.categorize_by_cpu,
+        'categorize_device': categorize_by_cpu.categorize_device,
+        'categorize_device_strict': fix_server_counts.categorize_device_strict,
+    }
+    if name in categorizers:
+        categorize = categorizers[name]
+        return lambda: [categorize(device) for device in fleet]
+
+    categories = {category: [] for category in fix_server_counts.CATEGORIES}
+    for device in fleet:
+        categories[fix_server_counts.categorize_device_strict(device)].append(device)
+    if name == 'csv_export':
+        filename = os.path.join(workdir, 'device_categories.csv')
+        return lambda: fix_server_counts.export_to_csv(categories, filename)
+    filename = os.path.join(workdir, 'category_summary.json')
+    return lambda: fix_server_counts.export_json_summary(categories, filename)
+
+
+def run_stage(name, size, seed, sites_dir, workdir):
+    """Build the fleet and time one stage; runs in its own process"""
+    fleet = generate_fleet(load_site_devices(sites_dir), size, seed)
+    function = stage_function(name, fleet, workdir)
+    return time_stage(name, size, function, peak_rss_mb())
+
+
+def benchmark_fleet(size, seed, sites_dir, workdir):
+    """Time every stage on one fleet size, each stage in a fresh process"""
+    results = []
+    for name in STAGES:
+        with ProcessPoolExecutor(max_workers=1, mp_context=get_context('spawn')) as executor:
+            results.append(executor.submit(run_stage, name, size, seed, sites_dir, workdir).result())
+    return results
+
+
+def git_commit():
+    """Current commit hash, or None outside a git checkout"""
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Benchmark the device categorizers on synthetic fleets")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help="comma separated fleet sizes")
+    parser.add_argument('--seed', type=int, default=0, help="random seed for fleet generation")
+    parser.add_argument('--sites-dir', default=SITES_DATA_DIR, help="directory of site CSV exports")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="JSON results file")
+    return parser.parse_args()
+
+
+def main():
+    """Main function"""
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(',') if size]
+
+    site_devices = load_site_devices(args.sites_dir)
+    if not site_devices:
+        print(f"No site exports found in {args.sites_dir}. Exiting.")
+        return
+    print(f"Loaded {len(site_devices)} devices from {args.sites_dir}")
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for size in sizes:
+            print(f"\n=== {size} devices ===", flush=True)
+            results.extend(benchmark_fleet(size, args.seed, args.sites_dir, workdir))
+
+    report = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': args.seed,
+        'source_devices': len(site_devices),
+        'results': results
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nBenchmark results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
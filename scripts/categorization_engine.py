@@ -0,0 +1,108 @@
+"""
+Shared Categorization Engine
+
+The categorization scripts describe CPU families as lists of regex patterns
+(SERVER_CPU_PATTERNS, VM_CPU_PATTERNS, ...). Testing those one `re.search` at a
+time costs one scan of the field per pattern. This module compiles each family
+into a single alternation, so a field is scanned once per family.
+
+Usage:
+  from categorization_engine import PatternFamily, CpuClassifier
+
+  SERVER = PatternFamily('Server', SERVER_CPU_PATTERNS)
+  if SERVER.matches(cpu):
+      ...
+
+Categorizers are memoized with `memoized_categorizer`, keyed on the normalized
+fields they read, since large fleets repeat the same CPU/model/OS strings.
+`categorize_in_processes` runs such a categorizer over chunks of field tuples
+in worker processes for very large exports.
+"""
+
+import os
+import re
+from functools import lru_cache
+from itertools import islice, repeat
+from concurrent.futures import ProcessPoolExecutor
+
+# Upper bound on memoized categorization results per function
+CATEGORY_CACHE_SIZE = int(os.getenv('CATEGORY_CACHE_SIZE', '65536'))
+
+# Devices per chunk sent to a worker process
+CATEGORIZE_CHUNK_SIZE = int(os.getenv('CATEGORIZE_CHUNK_SIZE', '5000'))
+
+
+class PatternFamily:
+    """A list of regex patterns compiled into one combined expression"""
+
+    def __init__(self, label, patterns):
+        self.label = label
+        self.patterns = list(patterns)
+        # Group-free, so it also suits vectorized matchers such as pandas' Series.str.contains
+        self.alternation = '|'.join(f'(?:{pattern})' for pattern in self.patterns)
+        self._combined = re.compile(self.alternation)
+
+    def matches(self, *fields):
+        """Return True if any pattern matches any of the given fields"""
+        search = self._combined.search
+        for text in fields:
+            if text and search(text):
+                return True
+        return False
+
+
+class CpuClassifier:
+    """Ordered pattern families; the first family that matches wins"""
+
+    def __init__(self, families, default='Unknown'):
+        self.families = [PatternFamily(label, patterns) for label, patterns in families]
+        self.default = default
+
+    def classify(self, text):
+        """Return the label of the first family matching text"""
+        for family in self.families:
+            if family.matches(text):
+                return family.label
+        return self.default
+
+
+def memoized_categorizer(function):
+    """Bounded LRU memo for a categorizer taking normalized string fields"""
+    return lru_cache(maxsize=CATEGORY_CACHE_SIZE)(function)
+
+
+def cache_summary(name, cached_function):
+    """Format the hit/miss counters of an lru_cache wrapped function"""
+    info = cached_function.cache_info()
+    lookups = info.hits + info.misses
+    hit_rate = (info.hits / lookups) * 100 if lookups > 0 else 0
+    return (f"{name} cache: {info.hits} hits, {info.misses} misses "
+            f"({hit_rate:.2f}% hit rate, {info.currsize}/{info.maxsize} entries)")
+
+
+def _chunked(iterable, size):
+    """Split an iterable into lists of at most size items"""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _categorize_chunk(categorize_fields, chunk):
+    """Worker entry point: categorize a chunk of field tuples"""
+    return [categorize_fields(*fields) for fields in chunk]
+
+
+def categorize_in_processes(field_tuples, categorize_fields, workers, chunk_size=CATEGORIZE_CHUNK_SIZE):
+    """Categorize field tuples in a process pool, yielding categories in input order
+
+    `categorize_fields` must be a module-level function taking the tuple's
+    fields as arguments so it can be pickled by reference. Workers only
+    receive the compact tuples, never the full device dicts.
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunks = _chunked(field_tuples, chunk_size)
+        for categories in executor.map(_categorize_chunk, repeat(categorize_fields), chunks):
+            yield from categories
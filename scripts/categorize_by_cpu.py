@@ -7,11 +7,22 @@ web searches for unknown CPU models to determine if they belong to server, deskt
 or laptop categories.
 
 Usage:
-  python categorize_by_cpu.py
+  python categorize_by_cpu.py [--scalar] [--check-parity] [--workers N] [--gzip]
+                              [--online-lookup] [--sites-dir [DIR]]
+
+  Input read from devices.csv is categorized column-wise on the DataFrame
+  (`categorize_dataframe`). --scalar forces the row-by-row `categorize_device`
+  path and --check-parity compares both before exporting. --workers runs the
+  row-by-row path in N worker processes for very large exports. --gzip writes
+  device_categories_cpu.csv.gz instead of a plain CSV. --online-lookup
+  resolves the CPUs of 'Other' devices that no pattern can type with one
+  concurrent, rate-limited and cached batch of web lookups. --sites-dir
+  categorizes the per-site exports in backend/sitesData (or DIR) directly.
 
 Dependencies:
   - requests
   - pandas
+  - numpy
   - dotenv
   - beautifulsoup4
 """
@@ -22,12 +33,19 @@ import re
 import json
 import csv
 import time
+import argparse
 import requests
 from bs4 import BeautifulSoup
+import numpy as np
 import pandas as pd
 from datetime import datetime
 from pathlib import Path
 from dotenv import load_dotenv
+from device_export import CategorizedCsvWriter
+from device_records import DeviceRecord
+from site_exports import SITES_DATA_DIR, stream_site_exports
+from cpu_knowledge import lookup_cpu, lookup_cpus, normalize_cpu_model
+from categorization_engine import CpuClassifier, memoized_categorizer, cache_summary, categorize_in_processes
 
 # Load environment variables
 load_dotenv()
@@ -53,12 +71,56 @@ VM_CPU_PATTERNS = [
     r'virtual', r'vm', r'vcpu', r'vmware', r'hypervisor'
 ]
 
+# Pattern families in priority order, each compiled into a single expression
+CPU_TYPE_CLASSIFIER = CpuClassifier([
+    ('VM', VM_CPU_PATTERNS),
+    ('Server', SERVER_CPU_PATTERNS),
+    ('Laptop', LAPTOP_CPU_PATTERNS),
+    ('Desktop', DESKTOP_CPU_PATTERNS),
+])
+
+CATEGORIES = [
+    'Server-Physical', 'Server-VM', 'Cell-phones-ATT', 'Cell-phones-Verizon',
+    'DLALION-License', 'Desktop', 'Laptop', 'Other'
+]
+
+# Online lookup results below this confidence are ignored
+ONLINE_CONFIDENCE = 0.6
+
+# Online lookup categories mapped onto CPU types
+ONLINE_CPU_TYPES = {'Server-Physical': 'Server', 'Server-VM': 'VM', 'Desktop': 'Desktop', 'Mobile': 'Laptop'}
+
+# Rows copied out of the DataFrame at a time by export_frame_to_csv
+EXPORT_CHUNK_ROWS = 10000
+
+# Columns exported for DeviceRecord input (site exports)
+RECORD_EXPORT_FIELDS = [
+    'id', 'hostname', 'model', 'device_type', 'cpu', 'os', 'serial', 'site',
+    'source_table', 'description', 'status', 'last_user', 'last_seen'
+]
+
+# DataFrame columns read by the categorizers
+DEVICE_COLUMNS = ['device_hostname', 'device_model', 'device_type', 'device_cpu', 'operating_system']
+
 # Path to save data
 DATA_DIR = Path("./data")
 DATA_DIR.mkdir(exist_ok=True)
 
-def fetch_device_data(input_file=None):
-    """Fetch device data from a file or mock data if file not found"""
+def load_device_frame(input_file):
+    """Load device data from a CSV file as a DataFrame, or None if unavailable"""
+    if not input_file or not os.path.exists(input_file):
+        return None
+    try:
+        return pd.read_csv(input_file)
+    except Exception as e:
+        print(f"Error reading file: {e}")
+        return None
+
+def fetch_device_data(input_file=None, sites_dir=None):
+    """Fetch device data from the site exports, a file, or mock data if neither is found"""
+    if sites_dir and os.path.isdir(sites_dir):
+        return list(stream_site_exports(sites_dir))
+    
     if input_file and os.path.exists(input_file):
         try:
             df = pd.read_csv(input_file)
@@ -108,72 +170,67 @@ def determine_cpu_type(cpu_model):
     if not cpu_model or not isinstance(cpu_model, str):
         return 'Unknown'
     
-    cpu_lower = cpu_model.lower()
-    
-    # Check for VMs first
-    for pattern in VM_CPU_PATTERNS:
-        if re.search(pattern, cpu_lower):
-            return 'VM'
-    
-    # Check for server CPUs
-    for pattern in SERVER_CPU_PATTERNS:
-        if re.search(pattern, cpu_lower):
-            return 'Server'
-    
-    # Check for laptop CPUs
-    for pattern in LAPTOP_CPU_PATTERNS:
-        if re.search(pattern, cpu_lower):
-            return 'Laptop'
-    
-    # Check for desktop CPUs
-    for pattern in DESKTOP_CPU_PATTERNS:
-        if re.search(pattern, cpu_lower):
-            return 'Desktop'
-    
-    # Unknown CPU type
-    return 'Unknown'
+    return _cpu_type_for(cpu_model.lower())
+
+@memoized_categorizer
+def _cpu_type_for(cpu_lower):
+    """Classify a lowercased CPU string; VMs first, then server, laptop and desktop CPUs"""
+    return CPU_TYPE_CLASSIFIER.classify(cpu_lower)
 
 def search_cpu_info(cpu_model):
-    """Search for CPU information online and determine if it's a server, desktop, or laptop CPU"""
+    """Search for CPU information online and determine if it's a server, desktop, or laptop CPU
+    
+    Pattern matching is tried first; only CPUs it cannot place are looked up,
+    through the persistent CPU knowledge cache.
+    """
     if not cpu_model or not isinstance(cpu_model, str):
         return 'Unknown'
     
-    try:
-        # Clean the CPU model for search
-        search_term = f"{cpu_model} cpu server or desktop"
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        
-        # This would normally use a search API but we'll just log what we would search for
-        print(f"Would search for: {search_term}")
-        
-        # For production, you would implement a real search using an API like:
-        # response = requests.get(f"https://api.search.com?q={search_term}", headers=headers)
-        
-        # For now, use the pattern matching as fallback
-        return determine_cpu_type(cpu_model)
-    except Exception as e:
-        print(f"Error searching for CPU info: {e}")
-        return 'Unknown'
+    cpu_type = determine_cpu_type(cpu_model)
+    if cpu_type != 'Unknown':
+        return cpu_type
+    
+    result = lookup_cpu(cpu_model)
+    if result['confidence'] > ONLINE_CONFIDENCE:
+        return ONLINE_CPU_TYPES.get(result['category'], 'Unknown')
+    return 'Unknown'
 
 def categorize_device(device):
     """Categorize a device based on its properties and CPU information"""
     if not device:
         return 'Unknown'
     
+    return _categorize_device_fields(*device_fields(device))
+
+def device_fields(device):
+    """Normalized (hostname, model, device_type, cpu, os) read by categorize_device"""
+    if isinstance(device, DeviceRecord):
+        return device.normalized
+    
     hostname = (device.get('device_hostname', '') or '').lower()
     model = (device.get('device_model', '') or '').lower()
     device_type = (device.get('device_type', '') or '').lower()
     cpu = device.get('device_cpu', '') or ''
     os = (device.get('operating_system', '') or '').lower()
     
+    return hostname, model, device_type, cpu.lower(), os
+
+def _categorize_device_fields(hostname, model, device_type, cpu, os):
+    """Categorize from the normalized fields read by categorize_device
+    
+    Only the CPU type is memoized (see _cpu_type_for); the remaining checks are
+    substring tests on fields that include the per-device hostname.
+    """
+    return categorize_with_cpu_type(hostname, model, device_type, cpu, os, determine_cpu_type(cpu))
+
+def categorize_with_cpu_type(hostname, model, device_type, cpu, os, cpu_type):
+    """Categorize normalized fields given the CPU type (from patterns or an online lookup)"""
     # First check for VMs
-    if any(pattern in hostname or pattern in model or pattern in device_type or pattern in cpu.lower() 
+    if any(pattern in hostname or pattern in model or pattern in device_type or pattern in cpu 
            for pattern in ['vm', 'virtual', 'vmware', 'vcpu']):
         return 'Server-VM'
     
     # CPU-based categorization
-    cpu_type = determine_cpu_type(cpu)
-    
     if cpu_type == 'VM':
         return 'Server-VM'
     
@@ -192,7 +249,7 @@ def categorize_device(device):
     # Server detection
     if cpu_type == 'Server' or 'server' in device_type or 'srv' in hostname:
         # Double check not a VM
-        if any(vm_pattern in cpu.lower() for vm_pattern in ['virtual', 'vm', 'vcpu']):
+        if any(vm_pattern in cpu for vm_pattern in ['virtual', 'vm', 'vcpu']):
             return 'Server-VM'
         return 'Server-Physical'
     
@@ -205,7 +262,7 @@ def categorize_device(device):
         return 'Desktop'
     
     # Device type based fallbacks
-    if 'server' in device_type and not any(vm_pattern in cpu.lower() for vm_pattern in ['virtual', 'vm', 'vcpu']):
+    if 'server' in device_type and not any(vm_pattern in cpu for vm_pattern in ['virtual', 'vm', 'vcpu']):
         return 'Server-Physical'
     
     if 'laptop' in device_type or 'notebook' in device_type:
@@ -231,23 +288,173 @@ def categorize_device(device):
     # Default to Other if no category could be determined
     return 'Other'
 
-def analyze_devices(devices):
-    """Analyze and categorize all devices"""
-    categories = {
-        'Server-Physical': [],
-        'Server-VM': [],
-        'Cell-phones-ATT': [],
-        'Cell-phones-Verizon': [],
-        'DLALION-License': [],
-        'Desktop': [],
-        'Laptop': [],
-        'Other': []
+def _text_column(df, column):
+    """Lowercased string column with missing values as ''"""
+    if column not in df:
+        return pd.Series('', index=df.index, dtype=object)
+    return df[column].fillna('').astype(str).str.lower()
+
+def _contains_any(series, needles):
+    """Boolean mask of rows containing any of the literal substrings"""
+    return series.str.contains('|'.join(re.escape(needle) for needle in needles), regex=True)
+
+def determine_cpu_types(cpu):
+    """Vectorized determine_cpu_type over a lowercased CPU column"""
+    conditions = [cpu.str.contains(family.alternation, regex=True) for family in CPU_TYPE_CLASSIFIER.families]
+    choices = [family.label for family in CPU_TYPE_CLASSIFIER.families]
+    return pd.Series(np.select(conditions, choices, default='Unknown'), index=cpu.index)
+
+def categorize_dataframe(df):
+    """Vectorized categorize_device; adds 'category' and 'cpu_type' columns in place
+    
+    The conditions below mirror the if-chain in `_categorize_device_fields`
+    and are evaluated with np.select, which picks the first match in order.
+    """
+    hostname = _text_column(df, 'device_hostname')
+    model = _text_column(df, 'device_model')
+    device_type = _text_column(df, 'device_type')
+    cpu = _text_column(df, 'device_cpu')
+    os = _text_column(df, 'operating_system')
+    cpu_type = determine_cpu_types(cpu)
+    
+    vm_anywhere = (_contains_any(hostname, ['vm', 'virtual', 'vmware', 'vcpu']) |
+                   _contains_any(model, ['vm', 'virtual', 'vmware', 'vcpu']) |
+                   _contains_any(device_type, ['vm', 'virtual', 'vmware', 'vcpu']) |
+                   _contains_any(cpu, ['vm', 'virtual', 'vmware', 'vcpu']))
+    vm_cpu = _contains_any(cpu, ['virtual', 'vm', 'vcpu'])
+    phone = _contains_any(device_type, ['phone', 'mobile'])
+    server = (cpu_type == 'Server') | device_type.str.contains('server', regex=False) | hostname.str.contains('srv', regex=False)
+    laptop_type = _contains_any(device_type, ['laptop', 'notebook'])
+    desktop_type = _contains_any(device_type, ['desktop', 'workstation'])
+    
+    rules = [
+        (vm_anywhere, 'Server-VM'),
+        (cpu_type == 'VM', 'Server-VM'),
+        (phone & _contains_any(hostname, ['att', 'at&t']), 'Cell-phones-ATT'),
+        (phone & _contains_any(hostname, ['verizon', 'vzw']), 'Cell-phones-Verizon'),
+        (phone, 'Other'),
+        (_contains_any(hostname, ['licen', 'lic']) | device_type.str.contains('licen', regex=False), 'DLALION-License'),
+        (server & vm_cpu, 'Server-VM'),
+        (server, 'Server-Physical'),
+        ((cpu_type == 'Laptop') | laptop_type, 'Laptop'),
+        ((cpu_type == 'Desktop') | desktop_type, 'Desktop'),
+        (device_type.str.contains('server', regex=False) & ~vm_cpu, 'Server-Physical'),
+        (laptop_type, 'Laptop'),
+        (desktop_type, 'Desktop'),
+        (_contains_any(model, ['poweredge', 'proliant', 'system x', 'thinkserver']), 'Server-Physical'),
+        (_contains_any(model, ['thinkpad', 'latitude', 'macbook', 'probook', 'elitebook']), 'Laptop'),
+        (_contains_any(model, ['optiplex', 'thinkcentre', 'prodesk', 'elitedesk']), 'Desktop'),
+        (os.str.contains('server', regex=False) & ~os.str.contains('workstation', regex=False), 'Server-Physical'),
+    ]
+    
+    df['category'] = np.select([mask for mask, _ in rules], [category for _, category in rules], default='Other')
+    df['cpu_type'] = cpu_type
+    return df
+
+def check_vectorized_parity(df):
+    """Compare categorize_dataframe against categorize_device row by row; returns mismatches"""
+    frame = pd.DataFrame({column: _text_column(df, column) for column in DEVICE_COLUMNS})
+    original = pd.DataFrame({column: df[column] if column in df else None for column in DEVICE_COLUMNS})
+    records = original.astype(object).where(original.notna(), None).to_dict('records')
+    categorize_dataframe(frame)
+    
+    mismatches = []
+    for index, record in zip(frame.index, records):
+        record = {key: (str(value) if value is not None else None) for key, value in record.items()}
+        expected = (categorize_device(record), determine_cpu_type(record['device_cpu'] or ''))
+        actual = (frame.at[index, 'category'], frame.at[index, 'cpu_type'])
+        if expected != actual:
+            mismatches.append((index, expected, actual))
+    
+    print(f"Parity check: {len(frame) - len(mismatches)}/{len(frame)} devices match the scalar categorizer")
+    for index, expected, actual in mismatches[:10]:
+        print(f"  row {index}: scalar={expected} vectorized={actual}")
+    return mismatches
+
+def online_cpu_types(cpus):
+    """Look up CPUs pattern matching could not type as one concurrent batch
+    
+    Returns {normalized CPU model: CPU type} for confident results.
+    """
+    return {
+        cpu_key: ONLINE_CPU_TYPES[result['category']]
+        for cpu_key, result in lookup_cpus(cpus).items()
+        if result['confidence'] > ONLINE_CONFIDENCE and result['category'] in ONLINE_CPU_TYPES
     }
+
+def recategorize_online(devices):
+    """Re-categorize 'Other' devices with an Unknown CPU type using batched online lookups
+    
+    `devices` is a list of (device, category) pairs; returns the updated
+    categories in the same order.
+    """
+    categories = [category for _, category in devices]
+    pending = []
+    for index, (device, category) in enumerate(devices):
+        fields = device_fields(device)
+        if category == 'Other' and fields[3] and determine_cpu_type(fields[3]) == 'Unknown':
+            pending.append((index, fields))
+    if not pending:
+        return categories
+    
+    cpu_types = online_cpu_types(fields[3] for _, fields in pending)
+    for index, fields in pending:
+        cpu_type = cpu_types.get(normalize_cpu_model(fields[3]))
+        if cpu_type:
+            categories[index] = categorize_with_cpu_type(*fields, cpu_type)
+    return categories
+
+def recategorize_frame_online(df):
+    """Apply recategorize_online to the 'Other' rows of a categorized DataFrame"""
+    other = df[(df['category'] == 'Other') & (df['cpu_type'] == 'Unknown')]
+    if other.empty:
+        return df
+    rows = [(row, 'Other') for row in other.to_dict('records')]
+    df.loc[other.index, 'category'] = recategorize_online(rows)
+    return df
+
+def analyze_device_frame(df, online_lookup=False):
+    """Analyze and categorize all devices of a DataFrame, column-wise"""
+    categorize_dataframe(df)
+    if online_lookup:
+        recategorize_frame_online(df)
+    counts = df['category'].value_counts()
+    
+    # Print summary
+    print("\n=== Device Categorization Results ===")
+    total_devices = len(df)
+    for category in CATEGORIES:
+        count = int(counts.get(category, 0))
+        percentage = (count / total_devices) * 100 if total_devices > 0 else 0
+        print(f"{category}: {count} devices ({percentage:.2f}%)")
+    
+    # Show CPU types for unknown devices
+    print("\n=== CPU Analysis for 'Other' Category ===")
+    for _, device in df[df['category'] == 'Other'].iterrows():
+        print(f"{device.get('device_hostname', 'N/A')}: {device.get('device_cpu', 'N/A')} - CPU Type: {device['cpu_type']}")
+    
+    return df
+
+def analyze_devices(devices, workers=1, online_lookup=False):
+    """Analyze and categorize all devices
+    
+    With workers > 1 the categorization runs in a process pool on compact
+    field tuples; results are merged back in device order.
+    """
+    categories = {category: [] for category in CATEGORIES}
+    
+    if workers > 1:
+        print(f"Categorizing in {workers} worker processes...")
+        field_tuples = (device_fields(device) for device in devices)
+        assigned = categorize_in_processes(field_tuples, _categorize_device_fields, workers)
+    else:
+        assigned = (categorize_device(device) for device in devices)
+    
+    if online_lookup:
+        assigned = recategorize_online(list(zip(devices, assigned)))
     
     # Process each device
-    for device in devices:
-        # First try to categorize using CPU info
-        category = categorize_device(device)
+    for device, category in zip(devices, assigned):
         categories[category].append(device)
     
     # Print summary
@@ -257,6 +464,7 @@ def analyze_devices(devices):
         count = len(devices_list)
         percentage = (count / total_devices) * 100 if total_devices > 0 else 0
         print(f"{category}: {count} devices ({percentage:.2f}%)")
+    print(cache_summary("CPU type", _cpu_type_for))
     
     # Show CPU types for unknown devices
     print("\n=== CPU Analysis for 'Other' Category ===")
@@ -413,42 +621,94 @@ export const categorizeDeviceExclusive = (device) => {{
   return 'Other';
 }};
 
+// Category ids in display order
+const EXCLUSIVE_CATEGORY_IDS = [
+  'Server-Physical', 'Server-VM', 'Cell-phones-ATT', 'Cell-phones-Verizon',
+  'DLALION-License', 'Desktop', 'Laptop', 'Other'
+];
+
+// Categories already computed per device object
+let deviceCategoryCache = new WeakMap();
+
+/**
+ * Memoized categorizeDeviceExclusive; call clearDeviceCategoryCache() after editing devices
+ */
+export const getDeviceCategory = (device) => {{
+  if (!device || typeof device !== 'object') return categorizeDeviceExclusive(device);
+  
+  let category = deviceCategoryCache.get(device);
+  if (category === undefined) {{
+    category = categorizeDeviceExclusive(device);
+    deviceCategoryCache.set(device, category);
+  }}
+  return category;
+}};
+
+export const clearDeviceCategoryCache = () => {{
+  deviceCategoryCache = new WeakMap();
+}};
+
+/**
+ * Categorize every device once and split them into per-category buckets
+ * Returns {{ buckets: {{category: [devices]}}, counts: {{category: number}} }}
+ */
+export const partitionDevices = (devices) => {{
+  const buckets = {{}};
+  const counts = {{}};
+  for (const category of EXCLUSIVE_CATEGORY_IDS) {{
+    buckets[category] = [];
+    counts[category] = 0;
+  }}
+  
+  for (const device of devices || []) {{
+    const category = getDeviceCategory(device);
+    if (!buckets[category]) {{
+      buckets[category] = [];
+      counts[category] = 0;
+    }}
+    buckets[category].push(device);
+    counts[category] += 1;
+  }}
+  return {{ buckets, counts }};
+}};
+
 /**
  * Get mutually exclusive device categories with their display names
+ * (the filters use getDeviceCategory; prefer partitionDevices to fill every tab at once)
  */
 export const getExclusiveDeviceCategories = () => {{
   return {{
     'Server-Physical': {{
       name: 'Server - Physical',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Server-Physical'
+      filter: (device) => getDeviceCategory(device) === 'Server-Physical'
     }},
     'Server-VM': {{
       name: 'Server - VM',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Server-VM'
+      filter: (device) => getDeviceCategory(device) === 'Server-VM'
     }},
     'Cell-phones-ATT': {{
       name: 'Cell Phones - ATT',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Cell-phones-ATT'
+      filter: (device) => getDeviceCategory(device) === 'Cell-phones-ATT'
     }},
     'Cell-phones-Verizon': {{
       name: 'Cell Phones - Verizon',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Cell-phones-Verizon'
+      filter: (device) => getDeviceCategory(device) === 'Cell-phones-Verizon'
     }},
     'DLALION-License': {{
       name: 'DLALION - License',
-      filter: (device) => categorizeDeviceExclusive(device) === 'DLALION-License'
+      filter: (device) => getDeviceCategory(device) === 'DLALION-License'
     }},
     'Desktop': {{
       name: 'Desktop Computers',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Desktop'
+      filter: (device) => getDeviceCategory(device) === 'Desktop'
     }},
     'Laptop': {{
       name: 'Laptops',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Laptop'
+      filter: (device) => getDeviceCategory(device) === 'Laptop'
     }},
     'Other': {{
       name: 'Other Devices',
-      filter: (device) => categorizeDeviceExclusive(device) === 'Other'
+      filter: (device) => getDeviceCategory(device) === 'Other'
     }}
   }};
 }};
@@ -460,48 +720,98 @@ export const getExclusiveDeviceCategories = () => {{
     
     print("\nGenerated CPU-based categorization code in 'cpu_based_categorization.js'")
 
-def export_to_csv(categories, filename='device_categories_cpu.csv'):
-    """Export categorized devices to CSV"""
-    all_devices = []
-    for category, devices in categories.items():
-        for device in devices:
-            device_copy = device.copy()
-            device_copy['category'] = category
-            device_copy['cpu_type'] = determine_cpu_type(device.get('device_cpu', ''))
-            all_devices.append(device_copy)
-    
-    if all_devices:
-        df = pd.DataFrame(all_devices)
-        df.to_csv(filename, index=False)
-        print(f"Exported categorization data to {filename}")
-    else:
+def export_to_csv(categories, filename='device_categories_cpu.csv', compress=False):
+    """Export categorized devices to CSV, streaming rows in the input's column order"""
+    first_device = next((device for devices in categories.values() for device in devices), None)
+    if first_device is None:
         print("No data to export")
+        return
+    
+    fields = RECORD_EXPORT_FIELDS if isinstance(first_device, DeviceRecord) else first_device.keys()
+    with CategorizedCsvWriter(filename, fields, extra_fields=('category', 'cpu_type'),
+                              compress=compress) as writer:
+        for category, devices in categories.items():
+            for device in devices:
+                writer.writerow(device, category, determine_cpu_type(device.get('device_cpu', '')))
+    print(f"Exported categorization data to {writer.filename}")
+
+def export_frame_to_csv(df, filename='device_categories_cpu.csv', compress=False):
+    """Export a categorized DataFrame to CSV, grouped by category like export_to_csv"""
+    if df.empty:
+        print("No data to export")
+        return
+    
+    # Only the row order is materialized; rows are written a chunk at a time
+    order = pd.Categorical(df['category'], categories=CATEGORIES, ordered=True)
+    positions = np.argsort(order.codes, kind='stable')
+    with CategorizedCsvWriter(filename, df.columns, extra_fields=(), compress=compress) as writer:
+        for start in range(0, len(positions), EXPORT_CHUNK_ROWS):
+            chunk = df.iloc[positions[start:start + EXPORT_CHUNK_ROWS]]
+            for values in chunk.itertuples(index=False, name=None):
+                writer.writevalues(values)
+    print(f"Exported categorization data to {writer.filename}")
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Categorize devices by CPU analysis")
+    parser.add_argument('--input', default='./devices.csv', help="device CSV export to categorize")
+    parser.add_argument('--scalar', action='store_true',
+                        help="categorize row by row instead of column-wise on the DataFrame")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="categorize row by row in this many worker processes (implies --scalar)")
+    parser.add_argument('--gzip', action='store_true',
+                        help="write the CSV report gzip compressed")
+    parser.add_argument('--check-parity', action='store_true',
+                        help="verify the vectorized categorizer against the scalar one")
+    parser.add_argument('--sites-dir', nargs='?', const=SITES_DATA_DIR,
+                        help="categorize every site export in this directory (default: backend/sitesData)")
+    parser.add_argument('--online-lookup', action='store_true',
+                        help="look up CPUs the patterns cannot type online, in one cached batch")
+    return parser.parse_args()
 
 def main():
     """Main function"""
+    args = parse_args()
     print("=== Device Categorization by CPU Analysis ===")
     
     # Get devices from CSV or use mock data
     print("Fetching device data...")
-    devices = fetch_device_data(input_file="./devices.csv")
+    df = None if args.scalar or args.workers > 1 or args.sites_dir else load_device_frame(args.input)
+    if df is not None:
+        print(f"Analyzing {len(df)} devices...")
+        if args.check_parity and check_vectorized_parity(df):
+            print("Vectorized categorization differs from categorize_device. Exiting.")
+            return
+        analyze_device_frame(df, online_lookup=args.online_lookup)
+        export_frame_to_csv(df, compress=args.gzip)
+        generate_js_code(df)
+        print_next_steps()
+        return
+    
+    devices = fetch_device_data(input_file=args.input, sites_dir=args.sites_dir)
     
     if not devices:
         print("No device data found. Exiting.")
         return
     
     print(f"Analyzing {len(devices)} devices...")
-    categories = analyze_devices(devices)
+    categories = analyze_devices(devices, workers=args.workers, online_lookup=args.online_lookup)
     
     # Export data
-    export_to_csv(categories)
+    export_to_csv(categories, compress=args.gzip)
     
     # Generate improved JS categorization
     generate_js_code(categories)
     
+    print_next_steps()
+
+def print_next_steps():
+    """Print instructions for using the generated files"""
     print("\nDone! Use the generated files to update your frontend code.")
     print("1. Import the new categorization functions from 'cpu_based_categorization.js'")
     print("2. Replace existing categorization with the CPU-based approach")
-    print("3. Review 'device_categories_cpu.csv' for details on how devices were categorized")
+    print("3. Use partitionDevices() to fill all category tabs in one pass")
+    print("4. Review 'device_categories_cpu.csv' for details on how devices were categorized")
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
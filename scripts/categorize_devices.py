@@ -10,18 +10,41 @@ to categorize devices into:
 4. DLALION - License
 
 It will connect to your database, analyze the data, and produce a report of the categorization.
+
+Usage:
+  python categorize_devices.py [--stream] [--bulk] [--db-workers N] [--itersize N]
+                               [--online-lookup] [--snapshot [FILE]]
+
+  --stream streams rows through server-side cursors and writes the CSV exports
+  as devices are categorized instead of loading the whole fleet first.
+  --bulk reads all site tables through one UNION ALL statement instead of one
+  query per table.
+  --db-workers runs the per-table queries concurrently over a connection pool.
+  --online-lookup searches the web for CPUs no pattern matches, as one
+  concurrent, rate-limited batch of distinct CPU models. Results are kept in a
+  local SQLite cache (cpu_knowledge_cache.sqlite3) so each CPU model is looked
+  up at most once per CPU_CACHE_TTL.
+  --snapshot reuses an Arrow snapshot of the extracted fleet (requires
+  pyarrow) while the tables' row counts and max(updated_at) are unchanged.
 """
 
 import psycopg2
 import json
-import re
 import os
 import sys
-import csv
+import argparse
 from collections import Counter
-import requests
-from bs4 import BeautifulSoup
 from dotenv import load_dotenv
+from categorization_engine import PatternFamily, memoized_categorizer, cache_summary
+from psycopg2.pool import ThreadedConnectionPool
+from device_extraction import (
+    EXTRACT_ITERSIZE, EXTRACT_WORKERS, list_device_tables, stream_device_rows,
+    stream_bulk_device_rows, stream_parallel_device_rows
+)
+from device_export import CategorizedCsvWriter
+from device_records import DeviceRecord
+from device_snapshot import load_or_extract
+from cpu_knowledge import lookup_cpu, lookup_cpus, normalize_cpu_model, default_cache
 
 # Load environment variables
 load_dotenv()
@@ -65,6 +88,46 @@ MOBILE_CPU_PATTERNS = [
     r'ryzen.*mobile', r'ryzen.*u'
 ]
 
+# Each pattern family compiled into a single expression
+SERVER_CPU_FAMILY = PatternFamily('Server-Physical', SERVER_CPU_PATTERNS)
+VM_CPU_FAMILY = PatternFamily('Server-VM', VM_CPU_PATTERNS)
+MOBILE_CPU_FAMILY = PatternFamily('Mobile', MOBILE_CPU_PATTERNS)
+DESKTOP_CPU_FAMILY = PatternFamily('Desktop', DESKTOP_CPU_PATTERNS)
+CPU_FAMILIES = [SERVER_CPU_FAMILY, VM_CPU_FAMILY, MOBILE_CPU_FAMILY, DESKTOP_CPU_FAMILY]
+
+CATEGORIES = [
+    'Server-Physical', 'Server-VM', 'Cell-phones-ATT', 'Cell-phones-Verizon',
+    'Cell-phones-Other', 'Desktop', 'Laptop', 'DLALION-License', 'Unknown'
+]
+
+DEVICE_FIELDS = ['id', 'hostname', 'model', 'device_type', 'cpu', 'os', 'source_table']
+
+# Snapshot of this script's extraction (see device_snapshot)
+CPU_SNAPSHOT_FILE = 'device_snapshot_cpu.arrow'
+
+DISTINCT_CPU_QUERY = """
+    SELECT DISTINCT device_cpu FROM {table} WHERE device_cpu IS NOT NULL
+"""
+
+# Online lookup results below this confidence are ignored
+ONLINE_CONFIDENCE = 0.6
+
+# Online lookup categories mapped onto CATEGORIES; None marks mobile CPUs,
+# which are split by carrier per device (see mobile_category)
+ONLINE_CATEGORIES = {
+    'Server-Physical': 'Server-Physical', 'Server-VM': 'Server-VM',
+    'Desktop': 'Desktop', 'Mobile': None
+}
+
+# Normalized CPU -> category lookup loaded by device_categorization.js
+CPU_LOOKUP_FILE = 'device_cpu_categories.json'
+
+DEVICE_QUERY = """
+    SELECT id, device_hostname, device_model, device_type, device_cpu, operating_system
+    FROM {table}
+    WHERE device_cpu IS NOT NULL
+"""
+
 def connect_to_db():
     """Connect to the PostgreSQL database"""
     try:
@@ -80,10 +143,28 @@ def connect_to_db():
         print(f"Database connection error: {e}")
         return None
 
-def extract_device_data(conn):
+def connect_pool(size):
+    """Create a thread-safe pool of database connections"""
+    try:
+        return ThreadedConnectionPool(
+            1, size,
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASS,
+            port=DB_PORT
+        )
+    except psycopg2.Error as e:
+        print(f"Database connection error: {e}")
+        return None
+
+def extract_device_data(conn, bulk=False, workers=EXTRACT_WORKERS):
     """Extract device data from the database"""
     data = []
     try:
+        if bulk or workers > 1:
+            return list(stream_device_data(conn, bulk=bulk, workers=workers))
+        
         with conn.cursor() as cur:
             # Get a list of device inventory tables
             cur.execute("""
@@ -95,37 +176,36 @@ def extract_device_data(conn):
             # For each table, extract device data
             for table in tables:
                 print(f"Extracting data from table: {table}")
-                cur.execute(f"""
-                    SELECT id, device_hostname, device_model, device_type, device_cpu, operating_system
-                    FROM {table}
-                    WHERE device_cpu IS NOT NULL
-                """)
+                cur.execute(DEVICE_QUERY.format(table=table))
                 rows = cur.fetchall()
                 for row in rows:
-                    id, hostname, model, device_type, cpu, os = row
-                    data.append({
-                        'id': id,
-                        'hostname': hostname,
-                        'model': model,
-                        'device_type': device_type,
-                        'cpu': cpu,
-                        'os': os,
-                        'source_table': table
-                    })
+                    data.append(DeviceRecord(*row, source_table=table))
         return data
     except psycopg2.Error as e:
         print(f"Data extraction error: {e}")
         return []
 
-def export_to_csv(data, filename="device_data.csv"):
-    """Export the data to a CSV file"""
+def stream_device_data(conn, itersize=EXTRACT_ITERSIZE, bulk=False, workers=EXTRACT_WORKERS):
+    """Stream device rows from the database as DeviceRecords"""
+    if bulk:
+        return stream_bulk_device_rows(conn, DEVICE_QUERY, DeviceRecord, itersize=itersize)
+    if workers > 1:
+        pool = connect_pool(workers)
+        if pool:
+            return stream_parallel_device_rows(conn, pool, DEVICE_QUERY, DeviceRecord, workers=workers)
+    return stream_device_rows(conn, DEVICE_QUERY, DeviceRecord, itersize=itersize)
+
+def export_to_csv(data, filename="device_data.csv", categories=None):
+    """Export the data to a CSV file, with a detected_category column when categories are given"""
     try:
-        with open(filename, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = data[0].keys() if data else []
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-            for row in data:
-                writer.writerow(row)
+        extra_fields = ('detected_category',) if categories is not None else ()
+        with CategorizedCsvWriter(filename, DEVICE_FIELDS, extra_fields=extra_fields) as writer:
+            if categories is None:
+                for device in data:
+                    writer.writerow(device)
+            else:
+                for device, category in zip(data, categories):
+                    writer.writerow(device, category)
         print(f"Data exported to {filename}")
         return True
     except Exception as e:
@@ -133,57 +213,62 @@ def export_to_csv(data, filename="device_data.csv"):
         return False
 
 def search_google_for_cpu(cpu_model):
-    """Search Google for information about a CPU model"""
+    """Search Google for information about a CPU model
+    
+    Results are served from the persistent CPU knowledge cache when the model
+    was already looked up within CPU_CACHE_TTL.
+    """
+    return lookup_cpu(cpu_model)
+
+def online_categories(cpus):
+    """Look up CPUs the patterns could not place as one concurrent batch
+    
+    Returns {normalized CPU model: lookup category} for confident results;
+    online_category maps them onto CATEGORIES per device.
+    """
+    return {
+        cpu_key: result['category']
+        for cpu_key, result in lookup_cpus(cpus).items()
+        if result['confidence'] > ONLINE_CONFIDENCE and result['category'] in ONLINE_CATEGORIES
+    }
+
+def online_category(device, resolved):
+    """Category of a device from the batch lookup results, or 'Unknown' if its CPU was not resolved"""
+    lookup_category = resolved.get(normalize_cpu_model(device.cpu))
+    if lookup_category is None:
+        return 'Unknown'
+    category = ONLINE_CATEGORIES[lookup_category]
+    if category is None:
+        hostname, model = device.normalized[:2]
+        return mobile_category(hostname, model)
+    return category
+
+def prefetch_online_categories(conn):
+    """Batch look up the distinct CPUs no pattern family matches, before streaming
+    
+    These are the only CPUs categorize_by_cpu can leave Unknown.
+    """
+    cpus = set()
     try:
-        query = f"{cpu_model} processor type server or desktop or mobile"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-        response = requests.get(url, headers=headers)
-        
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Extract the search results text
-            search_results = soup.get_text()
-            
-            # Look for keywords in the search results
-            server_keywords = ['server', 'datacenter', 'enterprise', 'rack', 'xeon']
-            desktop_keywords = ['desktop', 'consumer', 'gaming', 'workstation']
-            mobile_keywords = ['mobile', 'phone', 'smartphone', 'tablet', 'low power']
-            vm_keywords = ['virtual', 'hypervisor', 'vm', 'cloud']
-            
-            # Count occurrences of keywords
-            server_count = sum(search_results.lower().count(keyword) for keyword in server_keywords)
-            desktop_count = sum(search_results.lower().count(keyword) for keyword in desktop_keywords)
-            mobile_count = sum(search_results.lower().count(keyword) for keyword in mobile_keywords)
-            vm_count = sum(search_results.lower().count(keyword) for keyword in vm_keywords)
-            
-            # Determine the most likely category
-            counts = {
-                'Server-Physical': server_count,
-                'Desktop': desktop_count,
-                'Mobile': mobile_count,
-                'Server-VM': vm_count
-            }
-            
-            max_category = max(counts, key=counts.get)
-            confidence = counts[max_category] / (sum(counts.values()) or 1)
-            
-            return {
-                'category': max_category,
-                'confidence': confidence,
-                'counts': counts
-            }
-        else:
-            return {'category': 'Unknown', 'confidence': 0, 'counts': {}}
-            
-    except Exception as e:
-        print(f"Google search error: {e}")
-        return {'category': 'Unknown', 'confidence': 0, 'counts': {}}
+        with conn.cursor() as cur:
+            for table in list_device_tables(conn):
+                cur.execute(DISTINCT_CPU_QUERY.format(table=table))
+                cpus.update(record[0] for record in cur.fetchall())
+    except psycopg2.Error as e:
+        print(f"Data extraction error: {e}")
+    return online_categories(
+        cpu for cpu in cpus
+        if not any(family.matches(cpu.lower()) for family in CPU_FAMILIES)
+    )
 
 def categorize_by_cpu(device):
     """Categorize a device based on its CPU information"""
+    if isinstance(device, DeviceRecord):
+        hostname, model, _, cpu, os = device.normalized
+        if not cpu:
+            return 'Unknown'
+        return _categorize_cpu_fields(cpu, hostname, model, os)
+    
     if not device.get('cpu'):
         return 'Unknown'
         
@@ -192,60 +277,133 @@ def categorize_by_cpu(device):
     model = device.get('model', '').lower()
     os = device.get('os', '').lower()
     
+    return _categorize_cpu_fields(cpu, hostname, model, os)
+
+def _categorize_cpu_fields(cpu, hostname, model, os):
+    """Categorize from the normalized fields read by categorize_by_cpu
+    
+    Hostnames are unique per device, so only the CPU family match is memoized
+    (see _cpu_family); the hostname checks run per device.
+    """
+    family = _cpu_family(cpu, os)
+    
     # Check server patterns
-    for pattern in SERVER_CPU_PATTERNS:
-        if re.search(pattern, cpu):
-            return 'Server-Physical'
+    if family == 'Server':
+        return 'Server-Physical'
             
     # Check VM patterns
-    for pattern in VM_CPU_PATTERNS:
-        if re.search(pattern, cpu) or re.search(pattern, hostname) or re.search(pattern, os):
-            return 'Server-VM'
+    if family == 'VM' or VM_CPU_FAMILY.matches(hostname):
+        return 'Server-VM'
             
     # Check mobile patterns
-    for pattern in MOBILE_CPU_PATTERNS:
-        if re.search(pattern, cpu):
-            # Check if it's ATT or Verizon
-            if 'att' in hostname or 'att' in model:
-                return 'Cell-phones-ATT'
-            elif 'verizon' in hostname or 'vzw' in model or 'verizon' in model:
-                return 'Cell-phones-Verizon'
-            else:
-                return 'Cell-phones-Other'
+    if family == 'Mobile':
+        return mobile_category(hostname, model)
                 
     # Check desktop patterns
-    for pattern in DESKTOP_CPU_PATTERNS:
-        if re.search(pattern, cpu):
-            return 'Desktop'
+    if family == 'Desktop':
+        return 'Desktop'
             
     # If hostname contains 'lic' or 'license'
     if 'lic' in hostname or 'dlalion' in hostname or 'license' in hostname:
         return 'DLALION-License'
             
-    # If we couldn't categorize with patterns, try online search
-    # (commented out to avoid making too many requests in testing)
-    # search_result = search_google_for_cpu(cpu)
-    # if search_result['confidence'] > 0.6:
-    #     return search_result['category']
-        
+    # If we couldn't categorize with patterns, --online-lookup resolves the
+    # remaining CPUs in one batch (see online_categories)
     return 'Unknown'
 
-def analyze_and_categorize():
+def mobile_category(hostname, model):
+    """Carrier category of a device with a mobile CPU, from its normalized hostname and model"""
+    # Check if it's ATT or Verizon
+    if 'att' in hostname or 'att' in model:
+        return 'Cell-phones-ATT'
+    elif 'verizon' in hostname or 'vzw' in model or 'verizon' in model:
+        return 'Cell-phones-Verizon'
+    else:
+        return 'Cell-phones-Other'
+
+@memoized_categorizer
+def _cpu_family(cpu, os):
+    """First of 'Server', 'VM', 'Mobile' and 'Desktop' whose patterns match, or None
+    
+    VM patterns are also tried on the OS; _categorize_cpu_fields tries them on
+    the hostname.
+    """
+    if SERVER_CPU_FAMILY.matches(cpu):
+        return 'Server'
+    if VM_CPU_FAMILY.matches(cpu, os):
+        return 'VM'
+    if MOBILE_CPU_FAMILY.matches(cpu):
+        return 'Mobile'
+    if DESKTOP_CPU_FAMILY.matches(cpu):
+        return 'Desktop'
+    return None
+
+def stream_and_categorize(conn, itersize=EXTRACT_ITERSIZE, bulk=False, workers=EXTRACT_WORKERS,
+                          online_lookup=False):
+    """Categorize devices streamed from the database, writing both CSV exports row by row
+    
+    Only the hostnames per category and the CPU mapping are retained.
+    Returns (details, cpu_category_map).
+    """
+    details = {category: [] for category in CATEGORIES}
+    cpu_category_map = {}
+    resolved = prefetch_online_categories(conn) if online_lookup else {}
+    
+    with CategorizedCsvWriter('device_data.csv', DEVICE_FIELDS, extra_fields=()) as raw_writer, \
+            CategorizedCsvWriter('categorized_devices.csv', DEVICE_FIELDS,
+                                 extra_fields=('detected_category',)) as categorized_writer:
+        for device in stream_device_data(conn, itersize, bulk=bulk, workers=workers):
+            category = categorize_by_cpu(device)
+            if category == 'Unknown' and resolved:
+                category = online_category(device, resolved)
+            raw_writer.writerow(device)
+            categorized_writer.writerow(device, category)
+            details[category].append(device.hostname)
+            
+            # Store CPU to category mapping
+            cpu = (device.cpu or '').lower()
+            if cpu:
+                cpu_category_map[cpu] = category
+    
+    print("Data exported to device_data.csv")
+    print("Data exported to categorized_devices.csv")
+    return details, cpu_category_map
+
+def analyze_and_categorize(stream=False, itersize=EXTRACT_ITERSIZE, bulk=False, workers=EXTRACT_WORKERS,
+                           online_lookup=False, snapshot=None):
     """Main function to analyze and categorize devices"""
     # Connect to database
     conn = connect_to_db()
+    if conn and stream:
+        try:
+            details, cpu_category_map = stream_and_categorize(conn, itersize, bulk=bulk, workers=workers,
+                                                              online_lookup=online_lookup)
+        except psycopg2.Error as e:
+            # The CSV writers discard a partial stream, and no report is written
+            print(f"Data extraction error: {e}")
+            conn.close()
+            sys.exit(1)
+        conn.close()
+        if not any(details.values()):
+            print("No data found. Exiting.")
+            return
+        report_results(details, cpu_category_map)
+        generate_js_mapping(cpu_category_map)
+        return
+    
     if not conn:
         print("Failed to connect to database. Using sample data for testing.")
         # Sample data for testing without database
-        data = [
+        data = [DeviceRecord.from_mapping(device) for device in [
             {'id': 1, 'hostname': 'srv001', 'model': 'PowerEdge R740', 'device_type': None, 'cpu': 'Intel Xeon Gold 6248R', 'os': 'Windows Server 2019'},
             {'id': 2, 'hostname': 'desktop001', 'model': 'OptiPlex 7080', 'device_type': None, 'cpu': 'Intel Core i7-10700', 'os': 'Windows 10 Pro'},
             {'id': 3, 'hostname': 'vm-web01', 'model': 'VMware Virtual Platform', 'device_type': None, 'cpu': 'Intel(R) Xeon(R) CPU E5-2670 0 @ 2.60GHz (4 vCPUs)', 'os': 'Ubuntu 20.04 LTS'},
             {'id': 4, 'hostname': 'att-phone1', 'model': 'iPhone 13', 'device_type': None, 'cpu': 'Apple A15 Bionic', 'os': 'iOS 15'},
             {'id': 5, 'hostname': 'license-srv1', 'model': 'License Server', 'device_type': None, 'cpu': 'Intel Xeon E3-1270 v6', 'os': 'Windows Server 2016'}
-        ]
+        ]]
     else:
-        data = extract_device_data(conn)
+        extract = lambda: extract_device_data(conn, bulk=bulk, workers=workers)
+        data = load_or_extract(conn, DEVICE_QUERY, extract, snapshot) if snapshot else extract()
         
     if not data:
         print("No data found. Exiting.")
@@ -257,70 +415,146 @@ def analyze_and_categorize():
     export_to_csv(data)
     
     # Categorize devices
-    categories = {
-        'Server-Physical': [],
-        'Server-VM': [],
-        'Cell-phones-ATT': [],
-        'Cell-phones-Verizon': [],
-        'Cell-phones-Other': [],
-        'Desktop': [],
-        'Laptop': [],
-        'DLALION-License': [],
-        'Unknown': []
-    }
+    categories = {category: [] for category in CATEGORIES}
     
     cpu_category_map = {}  # To store CPU -> category mapping
+    assigned = [categorize_by_cpu(device) for device in data]
+    if online_lookup:
+        resolved = online_categories(
+            device.cpu for device, category in zip(data, assigned) if category == 'Unknown'
+        )
+        assigned = [
+            online_category(device, resolved) if category == 'Unknown' else category
+            for device, category in zip(data, assigned)
+        ]
     
-    for device in data:
-        category = categorize_by_cpu(device)
+    for device, category in zip(data, assigned):
         categories[category].append(device)
         
         # Store CPU to category mapping
-        cpu = device.get('cpu', '').lower()
+        cpu = device.normalized[3]
         if cpu:
             cpu_category_map[cpu] = category
     
-    # Print category statistics
+    report_results(
+        {category: [d['hostname'] for d in devices] for category, devices in categories.items()},
+        cpu_category_map
+    )
+    
+    # Export categorized data
+    export_to_csv(data, "categorized_devices.csv", assigned)
+    
+    # Generate JavaScript code for frontend use
+    generate_js_mapping(cpu_category_map)
+    
+    # Close database connection
+    if conn:
+        conn.close()
+
+def report_results(details, cpu_category_map):
+    """Print category statistics and export categorization_results.json"""
     print("\n=== Device Categorization Results ===")
-    total_devices = len(data)
-    for category, devices in categories.items():
-        count = len(devices)
+    total_devices = sum(len(hostnames) for hostnames in details.values())
+    for category, hostnames in details.items():
+        count = len(hostnames)
         percentage = (count / total_devices) * 100 if total_devices > 0 else 0
         print(f"{category}: {count} devices ({percentage:.2f}%)")
+    print(cache_summary("CPU family", _cpu_family))
     
     # Export results
     with open('categorization_results.json', 'w') as f:
         json.dump({
-            'summary': {category: len(devices) for category, devices in categories.items()},
-            'details': {category: [d['hostname'] for d in devices] for category, devices in categories.items()},
+            'summary': {category: len(hostnames) for category, hostnames in details.items()},
+            'details': details,
             'cpu_mapping': cpu_category_map
         }, f, indent=2)
+
+def cpu_lookup_table(cpu_category_map):
+    """Group the CPU mapping by category under normalized CPU keys
     
-    # Export categorized data
-    categorized_data = []
-    for device in data:
-        device_copy = device.copy()
-        device_copy['detected_category'] = categorize_by_cpu(device)
-        categorized_data.append(device_copy)
+    CPU strings that differ only in clock speed or trademark marks share one
+    key; if their categories disagree the most common one wins.
+    """
+    votes = {}
+    for cpu, category in cpu_category_map.items():
+        key = normalize_cpu_model(cpu)
+        if key:
+            votes.setdefault(key, Counter())[category] += 1
     
-    export_to_csv(categorized_data, "categorized_devices.csv")
+    table = {}
+    for key in sorted(votes):
+        table.setdefault(votes[key].most_common(1)[0][0], []).append(key)
+    return table
+
+def write_cpu_lookup(cpu_category_map, filename=CPU_LOOKUP_FILE):
+    """Write the normalized CPU lookup table as compact JSON for the frontend to load lazily"""
+    table = cpu_lookup_table(cpu_category_map)
+    with open(filename, 'w', encoding='utf-8') as f:
+        json.dump(table, f, separators=(',', ':'))
+    keys = sum(len(cpus) for cpus in table.values())
+    print(f"CPU lookup table with {keys} keys ({len(cpu_category_map)} CPU strings) written to {filename}")
+
+def generate_js_mapping(cpu_category_map):
+    """Generate JavaScript code for frontend use, with the CPU mapping as a separate JSON asset"""
+    write_cpu_lookup(cpu_category_map)
     
-    # Generate JavaScript code for frontend use
     js_mapping = """
-// CPU categorization mappings for frontend use
-const cpuCategoryMap = {
-"""
-    
-    for cpu, category in cpu_category_map.items():
-        js_mapping += f"  '{cpu}': '{category}',\n"
-    
-    js_mapping += """};
+// CPU categorization lookup for frontend use, loaded lazily from """ + CPU_LOOKUP_FILE + """
+// ({category: [normalized CPU keys]}), see loadCpuCategoryMap()
+
+// Same normalization as cpu_knowledge.normalize_cpu_model
+const CPU_NOISE = /\\((?:r|tm)\\)|\\bcpu\\b|\\bprocessor\\b|@\\s*[\\d.]+\\s*[gm]hz|\\(\\d+\\s*v?cpus?\\)/g;
+
+function normalizeCpuKey(cpu) {
+  return (cpu || '').toLowerCase().replace(CPU_NOISE, ' ').trim().split(/\\s+/).join(' ');
+}
+
+let cpuCategoryMap = null;
+let cpuCategoryMapPromise = null;
+
+// Fetch the lookup table once; await it before rendering to have every CPU
+// looked up, otherwise detectDeviceCategory starts it on first use
+export function loadCpuCategoryMap(url = '/""" + CPU_LOOKUP_FILE + """') {
+  if (!cpuCategoryMapPromise) {
+    cpuCategoryMapPromise = fetch(url)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`Failed to load ${url}: ${response.status}`);
+        }
+        return response.json();
+      })
+      .then(table => {
+        const map = new Map();
+        for (const [category, cpus] of Object.entries(table)) {
+          for (const cpu of cpus) {
+            map.set(cpu, category);
+          }
+        }
+        cpuCategoryMap = map;
+        return map;
+      })
+      .catch(error => {
+        // Allow a later call to retry
+        cpuCategoryMapPromise = null;
+        throw error;
+      });
+  }
+  return cpuCategoryMapPromise;
+}
 
 // Category detection function
-function detectDeviceCategory(device) {
-  // First check if we have an exact CPU match
-  if (device.device_cpu && cpuCategoryMap[device.device_cpu.toLowerCase()]) {
-    return cpuCategoryMap[device.device_cpu.toLowerCase()];
+export function detectDeviceCategory(device) {
+  if (!cpuCategoryMap && !cpuCategoryMapPromise) {
+    // Start loading the lookup table; devices are matched by pattern until it arrives
+    loadCpuCategoryMap().catch(error => console.warn(error));
+  }
+  
+  // First check if we have a CPU match
+  if (cpuCategoryMap && device.device_cpu) {
+    const category = cpuCategoryMap.get(normalizeCpuKey(device.device_cpu));
+    if (category) {
+      return category;
+    }
   }
   
   const cpu = (device.device_cpu || '').toLowerCase();
@@ -392,10 +626,28 @@ function detectDeviceCategory(device) {
         f.write(js_mapping)
     
     print("\nJS code generated in device_categorization.js")
-    
-    # Close database connection
-    if conn:
-        conn.close()
-    
+
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Categorize devices by CPU information")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream rows through server-side cursors instead of loading the fleet")
+    parser.add_argument('--bulk', action='store_true',
+                        help="read all site tables through a single UNION ALL statement")
+    parser.add_argument('--db-workers', type=int, default=EXTRACT_WORKERS,
+                        help="concurrent per-table queries over a connection pool")
+    parser.add_argument('--online-lookup', action='store_true',
+                        help="look up CPUs the patterns cannot place online, through the local cache")
+    parser.add_argument('--snapshot', nargs='?', const=CPU_SNAPSHOT_FILE,
+                        help="reuse a columnar snapshot of the extracted fleet while the tables are unchanged")
+    parser.add_argument('--itersize', type=int, default=EXTRACT_ITERSIZE,
+                        help="rows fetched per round trip in streaming mode")
+    return parser.parse_args()
+
 if __name__ == "__main__":
-    analyze_and_categorize() 
\ No newline at end of file
+    args = parse_args()
+    analyze_and_categorize(stream=args.stream, itersize=args.itersize, bulk=args.bulk,
+                           workers=args.db_workers, online_lookup=args.online_lookup,
+                           snapshot=args.snapshot)
+    if args.online_lookup:
+        print(default_cache().summary())
\ No newline at end of file
@@ -0,0 +1,293 @@
+"""
+CPU Knowledge Cache
+
+Online CPU lookups (a web search scored by category keywords) are slow and
+rate limited, while a fleet only contains a few hundred distinct CPU models.
+Results are kept in a local SQLite database keyed on the normalized CPU model
+string, so each model is looked up at most once per CPU_CACHE_TTL across
+runs. Entries past their TTL are refreshed on the next lookup and the least
+recently used entries are evicted beyond CPU_CACHE_MAX_ENTRIES.
+
+Failed lookups are not cached, so they are retried on the next run.
+
+`lookup_cpus` resolves a batch of CPU models at once: models are
+deduplicated by normalized key, cached ones are answered locally and the
+misses are fetched concurrently with aiohttp, under a global concurrency
+cap and a token-bucket rate limit, with retries and exponential backoff.
+
+Usage:
+  from cpu_knowledge import lookup_cpu
+
+  result = lookup_cpu('Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz')
+  if result['confidence'] > 0.6:
+      category = result['category']
+
+  results = lookup_cpus(unknown_cpus)   # {normalized key: result}
+"""
+
+import asyncio
+import json
+import os
+import re
+import sqlite3
+import time
+
+import aiohttp
+import requests
+from bs4 import BeautifulSoup
+
+# Search endpoint queried for CPU models missing from the cache
+CPU_LOOKUP_URL = os.getenv('CPU_LOOKUP_URL', 'https://www.google.com/search')
+CPU_LOOKUP_TIMEOUT = float(os.getenv('CPU_LOOKUP_TIMEOUT', '10'))
+
+# Batch lookups: requests in flight, requests per second, and retries per CPU
+CPU_LOOKUP_CONCURRENCY = int(os.getenv('CPU_LOOKUP_CONCURRENCY', '8'))
+CPU_LOOKUP_RATE = float(os.getenv('CPU_LOOKUP_RATE', '10'))
+CPU_LOOKUP_RETRIES = int(os.getenv('CPU_LOOKUP_RETRIES', '3'))
+CPU_LOOKUP_BACKOFF = float(os.getenv('CPU_LOOKUP_BACKOFF', '0.5'))
+
+# Responses worth retrying: rate limited or a transient server error
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# SQLite file, entry lifetime (seconds) and size bound of the knowledge cache
+CPU_CACHE_FILE = os.getenv('CPU_CACHE_FILE', 'cpu_knowledge_cache.sqlite3')
+CPU_CACHE_TTL = int(os.getenv('CPU_CACHE_TTL', str(30 * 24 * 3600)))
+CPU_CACHE_MAX_ENTRIES = int(os.getenv('CPU_CACHE_MAX_ENTRIES', '10000'))
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+# Keywords counted in the search results for each category
+CATEGORY_KEYWORDS = {
+    'Server-Physical': ['server', 'datacenter', 'enterprise', 'rack', 'xeon'],
+    'Desktop': ['desktop', 'consumer', 'gaming', 'workstation'],
+    'Mobile': ['mobile', 'phone', 'smartphone', 'tablet', 'low power'],
+    'Server-VM': ['virtual', 'hypervisor', 'vm', 'cloud'],
+}
+
+UNKNOWN_RESULT = {'category': 'Unknown', 'confidence': 0, 'counts': {}}
+
+# Decorations that vary between inventory sources for the same CPU model
+CPU_NOISE = re.compile(r'\((?:r|tm)\)|\bcpu\b|\bprocessor\b|@\s*[\d.]+\s*[gm]hz|\(\d+\s*v?cpus?\)')
+
+CACHE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS cpu_knowledge (
+        cpu_key TEXT PRIMARY KEY,
+        category TEXT NOT NULL,
+        confidence REAL NOT NULL,
+        counts TEXT NOT NULL,
+        looked_up_at REAL NOT NULL,
+        last_used_at REAL NOT NULL
+    )
+"""
+
+
+def normalize_cpu_model(cpu_model):
+    """Cache key for a CPU model: lowercased, without trademarks, clock speed or vCPU counts"""
+    if not cpu_model:
+        return ''
+    return ' '.join(CPU_NOISE.sub(' ', str(cpu_model).lower()).split())
+
+
+def score_search_text(text):
+    """Pick the category whose keywords occur most often in the search text"""
+    text = text.lower()
+    counts = {
+        category: sum(text.count(keyword) for keyword in keywords)
+        for category, keywords in CATEGORY_KEYWORDS.items()
+    }
+    category = max(counts, key=counts.get)
+    confidence = counts[category] / (sum(counts.values()) or 1)
+    return {'category': category, 'confidence': confidence, 'counts': counts}
+
+
+def search_query(cpu_key):
+    """Search terms sent for a normalized CPU model"""
+    return f"{cpu_key} processor type server or desktop or mobile"
+
+
+def fetch_cpu_knowledge(cpu_key, session=requests):
+    """Search the web for a normalized CPU model and score the results
+
+    Raises requests.RequestException when the lookup fails.
+    """
+    response = session.get(CPU_LOOKUP_URL, params={'q': search_query(cpu_key)},
+                           headers=HEADERS, timeout=CPU_LOOKUP_TIMEOUT)
+    response.raise_for_status()
+    return score_search_text(BeautifulSoup(response.text, 'html.parser').get_text())
+
+
+class CpuKnowledgeCache:
+    """SQLite-backed CPU lookup results with a TTL and LRU size bound"""
+
+    def __init__(self, filename=CPU_CACHE_FILE, ttl=CPU_CACHE_TTL, max_entries=CPU_CACHE_MAX_ENTRIES):
+        self.filename = filename
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._conn = sqlite3.connect(filename, timeout=30)
+        with self._conn:
+            self._conn.execute(CACHE_SCHEMA)
+            self._conn.execute("DELETE FROM cpu_knowledge WHERE looked_up_at < ?", (time.time() - ttl,))
+
+    def get(self, cpu_key):
+        """Return the cached result for a normalized CPU model, or None if missing or expired"""
+        now = time.time()
+        row = self._conn.execute(
+            "SELECT category, confidence, counts FROM cpu_knowledge WHERE cpu_key = ? AND looked_up_at >= ?",
+            (cpu_key, now - self.ttl)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        with self._conn:
+            self._conn.execute("UPDATE cpu_knowledge SET last_used_at = ? WHERE cpu_key = ?", (now, cpu_key))
+        category, confidence, counts = row
+        return {'category': category, 'confidence': confidence, 'counts': json.loads(counts)}
+
+    def put(self, cpu_key, result):
+        """Store a lookup result and evict the least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO cpu_knowledge VALUES (?, ?, ?, ?, ?, ?)",
+                (cpu_key, result['category'], result['confidence'], json.dumps(result.get('counts', {})), now, now)
+            )
+            self._conn.execute("""
+                DELETE FROM cpu_knowledge WHERE cpu_key IN (
+                    SELECT cpu_key FROM cpu_knowledge ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def summary(self):
+        """Format the hit/miss counters of this run"""
+        lookups = self.hits + self.misses
+        hit_rate = (self.hits / lookups) * 100 if lookups > 0 else 0
+        return f"CPU knowledge cache: {self.hits} hits, {self.misses} misses ({hit_rate:.2f}% hit rate)"
+
+    def close(self):
+        """Close the SQLite connection"""
+        self._conn.close()
+
+
+_default_cache = None
+
+
+def default_cache():
+    """The process-wide cache, opened on first use"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = CpuKnowledgeCache()
+    return _default_cache
+
+
+def lookup_cpu(cpu_model, cache=None, fetch=fetch_cpu_knowledge):
+    """Return {'category', 'confidence', 'counts'} for a CPU model, hitting the network only on cache misses"""
+    cpu_key = normalize_cpu_model(cpu_model)
+    if not cpu_key:
+        return dict(UNKNOWN_RESULT)
+    cache = cache or default_cache()
+
+    result = cache.get(cpu_key)
+    if result is not None:
+        return result
+    try:
+        result = fetch(cpu_key)
+    except requests.RequestException as e:
+        print(f"CPU lookup error for {cpu_key}: {e}")
+        return dict(UNKNOWN_RESULT)
+    cache.put(cpu_key, result)
+    return result
+
+
+class TokenBucket:
+    """Async token bucket allowing `rate` acquisitions per second, bursting up to `capacity`"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+async def fetch_cpu_knowledge_async(session, cpu_key, semaphore, bucket,
+                                    retries=CPU_LOOKUP_RETRIES, backoff=CPU_LOOKUP_BACKOFF):
+    """Fetch and score one normalized CPU model, or return None once retries are exhausted"""
+    for attempt in range(retries + 1):
+        if attempt:
+            await asyncio.sleep(backoff * 2 ** (attempt - 1))
+        await bucket.acquire()
+        try:
+            async with semaphore:
+                async with session.get(CPU_LOOKUP_URL, params={'q': search_query(cpu_key)}) as response:
+                    if response.status in RETRY_STATUSES:
+                        continue
+                    response.raise_for_status()
+                    text = await response.text()
+        except aiohttp.ClientResponseError as e:
+            print(f"CPU lookup error for {cpu_key}: {e}")
+            return None
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            continue
+        return score_search_text(BeautifulSoup(text, 'html.parser').get_text())
+    print(f"CPU lookup for {cpu_key} failed after {retries + 1} attempts")
+    return None
+
+
+async def fetch_many_cpu_knowledge(cpu_keys, concurrency=CPU_LOOKUP_CONCURRENCY, rate=CPU_LOOKUP_RATE):
+    """Fetch normalized CPU models concurrently; returns {key: result} for the lookups that succeeded"""
+    semaphore = asyncio.Semaphore(concurrency)
+    bucket = TokenBucket(rate)
+    timeout = aiohttp.ClientTimeout(total=CPU_LOOKUP_TIMEOUT)
+    async with aiohttp.ClientSession(headers=HEADERS, timeout=timeout) as session:
+        results = await asyncio.gather(*(
+            fetch_cpu_knowledge_async(session, cpu_key, semaphore, bucket) for cpu_key in cpu_keys
+        ))
+    return {cpu_key: result for cpu_key, result in zip(cpu_keys, results) if result is not None}
+
+
+def lookup_cpus(cpu_models, cache=None, concurrency=CPU_LOOKUP_CONCURRENCY, rate=CPU_LOOKUP_RATE):
+    """Resolve many CPU models at once, returning {normalized key: result}
+
+    Each distinct model is answered from the cache or fetched once; models
+    whose lookup failed are left out.
+    """
+    cpu_keys = {normalize_cpu_model(cpu_model) for cpu_model in cpu_models}
+    cpu_keys.discard('')
+    cache = cache or default_cache()
+
+    results = {}
+    misses = []
+    for cpu_key in sorted(cpu_keys):
+        result = cache.get(cpu_key)
+        if result is None:
+            misses.append(cpu_key)
+        else:
+            results[cpu_key] = result
+    if not misses:
+        return results
+
+    print(f"Looking up {len(misses)} CPU models online ({len(results)} cached)...")
+    started = time.time()
+    fetched = asyncio.run(fetch_many_cpu_knowledge(misses, concurrency, rate))
+    for cpu_key, result in fetched.items():
+        cache.put(cpu_key, result)
+    results.update(fetched)
+    print(f"Resolved {len(fetched)} of {len(misses)} CPU models in {time.time() - started:.2f}s")
+    return results
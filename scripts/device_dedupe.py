@@ -0,0 +1,388 @@
+"""
+Duplicate Device Detection
+
+The same machine often appears in several site exports or site tables
+(Dameron Hospital1-5 overlap heavily). Duplicates are found in linear time
+with hash indexes over normalized serial numbers and individual MAC
+addresses: every device sharing a serial or a MAC with another is joined into
+one group (union-find), without comparing devices pairwise.
+
+Placeholder serials ("To Be Filled By O.E.M.", ...) are ignored, and so are
+MACs that appear on devices with different serials, which are virtual
+adapters (VPN clients, VMware host-only networks) rather than hardware.
+
+Within a group the most recently seen device is kept.
+
+Near-duplicates that no exact key catches ("ACC4-800" vs "ACC4800", vendor
+noise in model strings) are reported by find_fuzzy_duplicates. Devices are
+blocked on the prefix and on the suffix of their normalized hostname, each
+block is sorted and only devices within a small window of each other are
+compared, so the number of comparisons grows linearly with the fleet.
+Candidates must carry the same hostname digits (AAMDT401 and AAMDT402 are
+different machines) and the same leading letters (CMCDHCP and CRMCDHCP are
+different sites' servers), and compatible models. Devices with equal
+normalized hostnames but different serials are only reported when they are
+at the same site or have the same model, since generic names (VPN, CCETest)
+recur across sites.
+
+Usage:
+  from device_dedupe import dedupe_devices, write_duplicate_report
+
+  devices, groups = dedupe_devices(devices)
+  write_duplicate_report(groups)
+"""
+
+import json
+import os
+import re
+from datetime import datetime
+from difflib import SequenceMatcher
+
+from device_records import DeviceRecord
+from device_extraction import EXTRACT_ITERSIZE, build_union_query, list_device_tables
+from site_exports import parse_last_seen
+
+DUPLICATE_REPORT_FILE = 'duplicate_devices.json'
+
+# Serial numbers that do not identify a machine
+SERIAL_PLACEHOLDERS = {
+    '', 'NA', 'NONE', 'NULL', 'UNKNOWN', '0', 'DEFAULT', 'DEFAULTSTRING', 'TOBEFILLEDBYOEM',
+    'SYSTEMSERIALNUMBER', 'CHASSISSERIALNUMBER', '123456789', '0123456789'
+}
+
+# MACs that do not identify a machine
+MAC_PLACEHOLDERS = {'000000000000', 'FFFFFFFFFFFF'}
+
+NON_ALPHANUMERIC = re.compile(r'[^0-9A-Z]')
+
+FUZZY_REPORT_FILE = 'fuzzy_duplicates.json'
+
+# Minimum hostname similarity (0-1) of a likely duplicate
+FUZZY_THRESHOLD = float(os.getenv('FUZZY_THRESHOLD', '0.93'))
+
+# Minimum model similarity when both devices have a model
+FUZZY_MODEL_THRESHOLD = float(os.getenv('FUZZY_MODEL_THRESHOLD', '0.6'))
+
+# Hostname characters used as the prefix and suffix blocking keys
+FUZZY_BLOCK_CHARS = 4
+
+# Each device is compared with this many following devices of its sorted block
+FUZZY_WINDOW = int(os.getenv('FUZZY_WINDOW', '4'))
+
+# Upper bound on candidate pairs compared per run
+FUZZY_MAX_PAIRS = int(os.getenv('FUZZY_MAX_PAIRS', '20000000'))
+
+# Vendor and filler words removed from models before comparing them
+MODEL_NOISE = re.compile(
+    r'\((?:r|tm)\)|\b(?:inc|corp|corporation|co|ltd|llc|computer|computers|hewlett[- ]packard|hp|dell|'
+    r'lenovo|system product name|to be filled by o\.e\.m\.)\b'
+)
+
+DIGITS = re.compile(r'\d+')
+
+# Leading letters of a normalized hostname, usually a site or role code
+ALPHA_PREFIX = re.compile(r'[A-Z]*')
+
+# Identity columns read from each site table to find duplicates; last_seen is
+# read as text because device_inventory stores it as VARCHAR
+IDENTITY_QUERY = """
+    SELECT id, device_hostname, serial_number, mac_addresses, last_seen::text
+    FROM {table}
+"""
+
+
+def normalize_serial(serial):
+    """Upper-case serial without separators, or None for placeholders"""
+    key = NON_ALPHANUMERIC.sub('', str(serial).upper()) if serial else ''
+    return None if key in SERIAL_PLACEHOLDERS else key
+
+
+def normalize_mac(mac):
+    """MAC address as 12 upper-case hex digits, or None if invalid or a placeholder"""
+    key = NON_ALPHANUMERIC.sub('', str(mac).upper()) if mac else ''
+    if len(key) != 12 or key in MAC_PLACEHOLDERS:
+        return None
+    return key
+
+
+def identity_record(id, hostname, serial, mac_addresses, last_seen, source_table=None):
+    """DeviceRecord holding only the fields read by IDENTITY_QUERY"""
+    return DeviceRecord(id=id, hostname=hostname, serial=serial, source_table=source_table,
+                        last_seen=parse_last_seen(last_seen), mac_addresses=tuple(mac_addresses or ()))
+
+
+def _find(parents, index):
+    """Root of a union-find set, halving the path on the way"""
+    while parents[index] != index:
+        parents[index] = parents[parents[index]]
+        index = parents[index]
+    return index
+
+
+def _union(parents, first, second):
+    """Join the sets of two devices; the lower index becomes the root"""
+    first, second = _find(parents, first), _find(parents, second)
+    if first != second:
+        parents[max(first, second)] = min(first, second)
+
+
+def _recency(device):
+    """Sort key preferring the most recently seen device, then the first one read"""
+    return device.last_seen is not None, device.last_seen or datetime.min
+
+
+def find_duplicate_groups(devices):
+    """Groups of indexes into `devices` that are the same machine, keeper first
+
+    One pass indexes serials and MACs; devices sharing a serial are joined
+    as they are read, devices sharing a MAC once all serials behind that MAC
+    are known.
+    """
+    parents = list(range(len(devices)))
+    serial_index = {}
+    mac_index = {}
+    serials = [None] * len(devices)
+
+    for index, device in enumerate(devices):
+        serial = normalize_serial(device.serial)
+        serials[index] = serial
+        if serial is not None:
+            first = serial_index.setdefault(serial, index)
+            if first != index:
+                _union(parents, first, index)
+        for mac in device.mac_addresses or ():
+            mac = normalize_mac(mac)
+            if mac is not None:
+                mac_index.setdefault(mac, []).append(index)
+
+    for indexes in mac_index.values():
+        if len(indexes) < 2:
+            continue
+        if len({serials[index] for index in indexes} - {None}) > 1:
+            # Shared by different machines: a virtual adapter
+            continue
+        for index in indexes[1:]:
+            _union(parents, indexes[0], index)
+
+    members = {}
+    for index in range(len(devices)):
+        members.setdefault(_find(parents, index), []).append(index)
+
+    groups = []
+    for indexes in members.values():
+        if len(indexes) > 1:
+            keeper = max(indexes, key=lambda index: (_recency(devices[index]), -index))
+            groups.append([keeper] + [index for index in indexes if index != keeper])
+    return groups
+
+
+def _group_report(devices, group):
+    """JSON-ready description of one duplicate group"""
+    members = [devices[index] for index in group]
+    return {
+        'serials': sorted({normalize_serial(device.serial) for device in members} - {None}),
+        'source_tables': sorted({device.source_table for device in members if device.source_table}),
+        'devices': [
+            {'source_table': device.source_table, 'id': device.id, 'hostname': device.hostname,
+             'serial': device.serial, 'kept': position == 0}
+            for position, device in enumerate(members)
+        ]
+    }
+
+
+def dedupe_devices(devices):
+    """Drop all but the keeper of each duplicate group, preserving order
+
+    Returns (unique devices, list of group reports).
+    """
+    devices = list(devices)
+    groups = find_duplicate_groups(devices)
+    dropped = {index for group in groups for index in group[1:]}
+    unique = [device for index, device in enumerate(devices) if index not in dropped]
+    print(f"Dedupe: {len(groups)} duplicate groups, {len(dropped)} of {len(devices)} devices dropped")
+    return unique, [_group_report(devices, group) for group in groups]
+
+
+def find_duplicate_ids(conn, itersize=EXTRACT_ITERSIZE):
+    """Find duplicates across the site tables from their identity columns only
+
+    Returns ({(source_table, id) of devices to skip}, list of group reports).
+    Database errors are raised: a failed read must not pass for "no duplicates".
+    """
+    devices = []
+    tables = list_device_tables(conn)
+    if tables:
+        with conn.cursor(name="dedupe_device_identities") as cur:
+            cur.itersize = itersize
+            cur.execute(build_union_query(conn, tables, IDENTITY_QUERY))
+            for row in cur:
+                devices.append(identity_record(*row[:-1], source_table=row[-1]))
+    groups = find_duplicate_groups(devices)
+    skipped = {(devices[index].source_table, devices[index].id) for group in groups for index in group[1:]}
+    print(f"Dedupe: {len(groups)} duplicate groups, {len(skipped)} of {len(devices)} devices skipped")
+    return skipped, [_group_report(devices, group) for group in groups]
+
+
+def skip_duplicates(devices, skipped):
+    """Filter a device stream by the (source_table, id) pairs of find_duplicate_ids"""
+    for device in devices:
+        if (device.source_table, device.id) not in skipped:
+            yield device
+
+
+def write_duplicate_report(groups, filename=DUPLICATE_REPORT_FILE):
+    """Write duplicate groups, largest first, as JSON"""
+    groups = sorted(groups, key=lambda group: len(group['devices']), reverse=True)
+    with open(filename, 'w') as f:
+        json.dump({
+            'groups': len(groups),
+            'duplicates': sum(len(group['devices']) - 1 for group in groups),
+            'duplicate_groups': groups,
+            'timestamp': datetime.now().isoformat()
+        }, f, indent=2, default=str)
+    print(f"Exported duplicate report to {filename}")
+
+
+def normalize_hostname(hostname):
+    """Upper-case hostname without separators or domain"""
+    if not hostname:
+        return ''
+    return NON_ALPHANUMERIC.sub('', str(hostname).split('.')[0].upper())
+
+
+def normalize_model(model):
+    """Lower-case model without vendor names or separators"""
+    if not model:
+        return ''
+    return NON_ALPHANUMERIC.sub('', MODEL_NOISE.sub(' ', str(model).lower()).upper())
+
+
+def _similarity(first, second):
+    """SequenceMatcher ratio with the cheap upper bounds checked first"""
+    if first == second:
+        return 1.0
+    matcher = SequenceMatcher(None, first, second)
+    return matcher.ratio() if matcher.real_quick_ratio() >= FUZZY_THRESHOLD else 0.0
+
+
+# (blocking key, sort key) of each blocking pass: hostname prefix, then suffix
+# with keys reversed so that neighbors in a block share their endings
+BLOCKING_PASSES = [
+    (lambda key: key[:FUZZY_BLOCK_CHARS], lambda key: key),
+    (lambda key: key[-FUZZY_BLOCK_CHARS:], lambda key: key[::-1]),
+]
+
+
+def _candidate_pairs(keys, window=FUZZY_WINDOW):
+    """Index pairs sharing a hostname block, at most `window` apart in the sorted block"""
+    for block_key, sort_key in BLOCKING_PASSES:
+        blocks = {}
+        for index, key in enumerate(keys):
+            if key:
+                blocks.setdefault(block_key(key), []).append(index)
+        for indexes in blocks.values():
+            indexes.sort(key=lambda index: sort_key(keys[index]))
+            for position, index in enumerate(indexes):
+                for other in indexes[position + 1:position + 1 + window]:
+                    yield min(index, other), max(index, other)
+
+
+def _models_compatible(first, second):
+    """True unless both devices have a model and the models differ too much"""
+    first, second = normalize_model(first.model), normalize_model(second.model)
+    if not first or not second or first == second:
+        return True
+    return SequenceMatcher(None, first, second).ratio() >= FUZZY_MODEL_THRESHOLD
+
+
+def _agreeing_groups(devices, indexes):
+    """Split devices sharing a hostname into groups joined by a common site or model"""
+    parents = list(range(len(indexes)))
+    first_seen = {}
+    for position, index in enumerate(indexes):
+        device = devices[index]
+        for key in (('site', _site(device)), ('model', normalize_model(device.model))):
+            if key[1]:
+                _union(parents, first_seen.setdefault(key, position), position)
+    groups = {}
+    for position, index in enumerate(indexes):
+        groups.setdefault(_find(parents, position), []).append(index)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def find_fuzzy_duplicates(devices, threshold=FUZZY_THRESHOLD, window=FUZZY_WINDOW, max_pairs=FUZZY_MAX_PAIRS):
+    """Likely duplicates by hostname and model similarity
+
+    Devices whose normalized hostnames are equal are grouped through a dict
+    first, and reported where they share a site or a model; blocking and
+    comparison then run over the distinct hostnames. Groups whose devices
+    all share one serial number are left to dedupe_devices. Returns a list
+    of (score, [device indexes]), best first.
+    """
+    by_key = {}
+    for index, device in enumerate(devices):
+        key = normalize_hostname(device.hostname)
+        if key:
+            by_key.setdefault(key, []).append(index)
+
+    matches = []
+    for indexes in by_key.values():
+        if len(indexes) < 2:
+            continue
+        for group in _agreeing_groups(devices, indexes):
+            serials = {normalize_serial(devices[index].serial) for index in group}
+            if len(serials) == 1 and None not in serials:
+                continue
+            matches.append((1.0, group))
+
+    keys = list(by_key)
+    digits = [''.join(DIGITS.findall(key)) for key in keys]
+    prefixes = [ALPHA_PREFIX.match(key).group() for key in keys]
+    found = set()
+    compared = 0
+    for first, second in _candidate_pairs(keys, window):
+        if compared >= max_pairs:
+            print(f"Fuzzy matching stopped after {max_pairs} candidate pairs")
+            break
+        compared += 1
+        if digits[first] != digits[second] or prefixes[first] != prefixes[second] or (first, second) in found:
+            continue
+        score = _similarity(keys[first], keys[second])
+        if score < threshold:
+            continue
+        first_device, second_device = devices[by_key[keys[first]][0]], devices[by_key[keys[second]][0]]
+        if _models_compatible(first_device, second_device):
+            found.add((first, second))
+            matches.append((score, [by_key[keys[first]][0], by_key[keys[second]][0]]))
+
+    print(f"Fuzzy matching: {len(matches)} likely duplicates, {compared} hostname pairs compared "
+          f"({len(devices)} devices, {len(keys)} distinct hostnames)")
+    matches.sort(key=lambda match: match[0], reverse=True)
+    return matches
+
+
+def _site(device):
+    return device.site or device.source_table or ''
+
+
+def write_fuzzy_report(devices, matches, filename=FUZZY_REPORT_FILE):
+    """Write likely duplicates grouped by site ("site A / site B" across sites) as JSON"""
+    sites = {}
+    for score, indexes in matches:
+        members = [devices[index] for index in indexes]
+        site = ' / '.join(sorted({_site(device) for device in members}))
+        sites.setdefault(site, []).append({
+            'score': round(score, 3),
+            'devices': [
+                {'source_table': device.source_table, 'id': device.id, 'hostname': device.hostname,
+                 'model': device.model, 'serial': device.serial}
+                for device in members
+            ]
+        })
+    with open(filename, 'w') as f:
+        json.dump({
+            'likely_duplicates': len(matches),
+            'sites': dict(sorted(sites.items())),
+            'timestamp': datetime.now().isoformat()
+        }, f, indent=2, default=str)
+    print(f"Exported fuzzy duplicate report to {filename}")
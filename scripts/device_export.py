@@ -0,0 +1,76 @@
+"""
+Device Export Helpers
+
+Streaming CSV export for the categorization scripts. Rows are written with
+csv.writer in a fixed column order through a buffered, optionally gzip
+compressed, file as each device is categorized, instead of copying every
+device into a DataFrame first. Rows go to a temporary file that replaces the
+export only when the writer is closed without an error, so a stream that fails
+part way leaves the previous export in place.
+
+Usage:
+  from device_export import CategorizedCsvWriter
+
+  with CategorizedCsvWriter('device_categories.csv', ['id', 'hostname']) as writer:
+      writer.writerow(device, category)
+"""
+
+import csv
+import gzip
+import os
+
+# Write buffer for plain CSV exports
+EXPORT_BUFFER_SIZE = int(os.getenv('EXPORT_BUFFER_SIZE', str(1024 * 1024)))
+
+
+class CategorizedCsvWriter:
+    """Buffered CSV writer for devices plus trailing category columns"""
+
+    def __init__(self, filename, fields, extra_fields=('category',), compress=False,
+                 buffer_size=EXPORT_BUFFER_SIZE):
+        if compress and not filename.endswith('.gz'):
+            filename = f"{filename}.gz"
+        self.filename = filename
+        self.fields = list(fields)
+        self.rows = 0
+        self._temp_filename = f"{filename}.tmp"
+
+        if compress:
+            self._file = gzip.open(self._temp_filename, 'wt', newline='', encoding='utf-8')
+        else:
+            self._file = open(self._temp_filename, 'w', newline='', encoding='utf-8', buffering=buffer_size)
+        self._writer = csv.writer(self._file, lineterminator='\n')
+        self._writer.writerow(self.fields + list(extra_fields))
+
+    def writerow(self, device, *extra):
+        """Write one device (dict or row tuple with .get) followed by extra values
+
+        Missing values, None or a pandas NaN, are written as empty cells.
+        """
+        values = [device.get(field) for field in self.fields]
+        self._writer.writerow([value if value == value else None for value in values] + list(extra))
+        self.rows += 1
+
+    def writevalues(self, values):
+        """Write one row whose values are already in header order"""
+        self._writer.writerow([value if value == value else None for value in values])
+        self.rows += 1
+
+    def close(self):
+        """Flush the rows written and move them into place"""
+        self._file.close()
+        os.replace(self._temp_filename, self.filename)
+
+    def discard(self):
+        """Drop the rows written, keeping any previous export"""
+        self._file.close()
+        os.remove(self._temp_filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
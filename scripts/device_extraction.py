@@ -0,0 +1,141 @@
+"""
+Device Extraction Helpers
+
+Shared PostgreSQL extraction used by the categorization scripts. Rows are
+streamed through named (server-side) cursors so only `itersize` rows are held
+in memory at a time, and are yielded as compact `DeviceRecord`s rather than
+per-row dicts.
+
+`stream_bulk_device_rows` pulls every site table through a single UNION ALL
+statement tagged with a `source_table` literal, instead of one query per
+`<site>_device_inventory` table. When a single statement is not possible,
+`stream_parallel_device_rows` fans the per-table queries out over a
+connection pool and still yields rows in table order.
+
+Queries select columns in DeviceRecord field order (id, hostname, model,
+device_type, cpu, os[, serial, site]); the source table is passed to the
+record factory as `source_table`.
+
+Usage:
+  from device_extraction import stream_device_rows
+  from device_records import DeviceRecord
+
+  query = "SELECT id, device_hostname, device_model FROM {table}"
+  for device in stream_device_rows(conn, query, DeviceRecord):
+      ...
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from psycopg2 import sql
+
+# Rows fetched per round trip by server-side cursors
+EXTRACT_ITERSIZE = int(os.getenv('EXTRACT_ITERSIZE', '2000'))
+
+# Concurrent per-table queries in parallel extraction (1 keeps it serial)
+EXTRACT_WORKERS = int(os.getenv('EXTRACT_WORKERS', '1'))
+
+DEVICE_TABLES_QUERY = """
+    SELECT table_name FROM information_schema.tables
+    WHERE table_name LIKE '%_device_inventory' OR table_name = 'device_inventory'
+"""
+
+
+def list_device_tables(conn):
+    """Return the names of all device inventory tables"""
+    with conn.cursor() as cur:
+        cur.execute(DEVICE_TABLES_QUERY)
+        return [record[0] for record in cur.fetchall()]
+
+
+def stream_device_rows(conn, query, record_type, itersize=EXTRACT_ITERSIZE):
+    """Yield rows from every device inventory table through server-side cursors
+
+    `query` is formatted with the table name. Database errors are raised to
+    the consumer, which must not take the rows seen so far for the whole fleet.
+    """
+    tables = list_device_tables(conn)
+    for table in tables:
+        print(f"Streaming data from table: {table}")
+        with conn.cursor(name=f"stream_{table}") as cur:
+            cur.itersize = itersize
+            cur.execute(query.format(table=table))
+            for row in cur:
+                yield record_type(*row, source_table=table)
+
+
+def build_union_query(conn, tables, query):
+    """Combine the per-table query into one UNION ALL statement tagged with its source table"""
+    return "\nUNION ALL\n".join(
+        f"SELECT q.*, {sql.Literal(table).as_string(conn)} AS source_table "
+        f"FROM ({query.format(table=table)}) AS q"
+        for table in tables
+    )
+
+
+def stream_bulk_device_rows(conn, query, record_type, itersize=EXTRACT_ITERSIZE):
+    """Yield rows from all device inventory tables through a single statement
+
+    The result set is still read through a server-side cursor, so rows are
+    parsed incrementally as each batch of `itersize` arrives. Database errors
+    are raised to the consumer, as in stream_device_rows.
+    """
+    tables = list_device_tables(conn)
+    if not tables:
+        return
+    print(f"Streaming data from {len(tables)} tables in a single query")
+    with conn.cursor(name="stream_all_device_tables") as cur:
+        cur.itersize = itersize
+        cur.execute(build_union_query(conn, tables, query))
+        for row in cur:
+            yield record_type(*row[:-1], source_table=row[-1])
+
+
+def fetch_table_rows(pool, query, table, record_type):
+    """Fetch one table's rows on a connection borrowed from the pool"""
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(query.format(table=table))
+            return [record_type(*row, source_table=table) for row in cur.fetchall()]
+    finally:
+        conn.rollback()
+        pool.putconn(conn)
+
+
+def stream_parallel_device_rows(conn, pool, query, record_type, workers=EXTRACT_WORKERS):
+    """Yield rows from every device inventory table, querying tables concurrently
+
+    At most `workers` tables are in flight at once. Results are yielded in
+    table discovery order regardless of which query finishes first, and the
+    pool is closed once the stream is exhausted. If a table's query fails, the
+    tables not yet started are cancelled and the error is raised to the
+    consumer, as in stream_device_rows.
+    """
+    try:
+        tables = list_device_tables(conn)
+        print(f"Extracting data from {len(tables)} tables with {workers} connections")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            remaining = iter(tables)
+            for table in remaining:
+                pending.append((table, executor.submit(fetch_table_rows, pool, query, table, record_type)))
+                if len(pending) >= workers:
+                    break
+            try:
+                while pending:
+                    table, future = pending.popleft()
+                    rows = future.result()
+                    next_table = next(remaining, None)
+                    if next_table is not None:
+                        pending.append((next_table, executor.submit(fetch_table_rows, pool, query, next_table, record_type)))
+                    print(f"Extracted {len(rows)} rows from table: {table}")
+                    yield from rows
+            finally:
+                # Only reached with tables pending on an error or an abandoned stream
+                for _, future in pending:
+                    future.cancel()
+    finally:
+        pool.closeall()
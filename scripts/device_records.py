@@ -0,0 +1,99 @@
+"""
+Device Records
+
+`DeviceRecord` is the compact device representation shared by extraction,
+categorization and export. It replaces the per-row dicts the scripts used to
+build: fields live in `__slots__`, the repeated site/table names and the
+descriptive strings that repeat across a fleet (model, CPU, OS, type) are
+interned, and the lowercased fields the categorizers read are computed once
+at construction.
+
+Records still answer `record.get('cpu')` and `record['cpu']` so code written
+against the old dicts keeps working; the database column names
+(`device_cpu`, `operating_system`, ...) are accepted as aliases.
+"""
+
+from sys import intern
+
+DEVICE_RECORD_FIELDS = (
+    'id', 'hostname', 'model', 'device_type', 'cpu', 'os', 'serial', 'site', 'source_table',
+    'description', 'status', 'last_user', 'last_seen', 'mac_addresses'
+)
+
+# Database column names accepted by get() and []
+FIELD_ALIASES = {
+    'device_hostname': 'hostname', 'device_model': 'model', 'device_cpu': 'cpu',
+    'operating_system': 'os', 'serial_number': 'serial', 'site_name': 'site',
+    'device_description': 'description'
+}
+
+_FIELD_NAMES = dict({field: field for field in DEVICE_RECORD_FIELDS}, **FIELD_ALIASES)
+
+
+def _intern(value):
+    """Intern strings, pass anything else (None, numbers) through"""
+    return intern(value) if isinstance(value, str) else value
+
+
+def _lower(value):
+    """Normalize a field the way the categorizers compare it"""
+    return intern(str(value).lower()) if value else ''
+
+
+class DeviceRecord:
+    """A device row with its normalized categorization fields"""
+
+    __slots__ = DEVICE_RECORD_FIELDS + ('normalized',)
+
+    def __init__(self, id=None, hostname=None, model=None, device_type=None, cpu=None,
+                 os=None, serial=None, site=None, source_table=None, description=None,
+                 status=None, last_user=None, last_seen=None, mac_addresses=None):
+        self.id = id
+        self.hostname = hostname
+        self.model = _intern(model)
+        self.device_type = _intern(device_type)
+        self.cpu = _intern(cpu)
+        self.os = _intern(os)
+        self.serial = serial
+        self.site = _intern(site)
+        self.source_table = _intern(source_table)
+        self.description = description
+        self.status = _intern(status)
+        self.last_user = last_user
+        # datetime of the last check-in, and a tuple of normalized MAC addresses
+        self.last_seen = last_seen
+        self.mac_addresses = mac_addresses
+        # Lowercased (hostname, model, device_type, cpu, os), '' when missing
+        self.normalized = (
+            str(hostname).lower() if hostname else '',
+            _lower(model), _lower(device_type), _lower(cpu), _lower(os)
+        )
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        """Build a record from a dict using the DEVICE_RECORD_FIELDS keys"""
+        return cls(**{field: mapping.get(field) for field in DEVICE_RECORD_FIELDS})
+
+    def get(self, field, default=None):
+        """Dict-style access to a field"""
+        name = _FIELD_NAMES.get(field)
+        if name is None:
+            return default
+        return getattr(self, name)
+
+    def __getitem__(self, field):
+        name = _FIELD_NAMES.get(field)
+        if name is None:
+            raise KeyError(field)
+        return getattr(self, name)
+
+    def keys(self):
+        """Field names, in export order"""
+        return list(DEVICE_RECORD_FIELDS)
+
+    def as_row(self, fields=DEVICE_RECORD_FIELDS):
+        """Field values as a tuple in the given order"""
+        return tuple(getattr(self, field) for field in fields)
+
+    def __repr__(self):
+        return f"DeviceRecord(id={self.id!r}, hostname={self.hostname!r}, source_table={self.source_table!r})"
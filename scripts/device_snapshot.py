@@ -0,0 +1,180 @@
+"""
+Device Snapshot Cache
+
+Opt-in columnar cache of the extracted fleet, so iterating on categorization
+rules does not re-extract every site table from PostgreSQL on each run.
+
+The extracted DeviceRecords are saved as an uncompressed Arrow IPC file with
+dictionary-encoded string columns, in record batches of SNAPSHOT_BATCH_ROWS.
+Later runs memory-map it and decode DeviceRecords one batch at a time as
+they are consumed, so loading costs no more than opening the file. The file is tagged with a fingerprint of its source: the extraction
+query plus each table's row count and max(updated_at). A snapshot is reused
+only while the fingerprint is unchanged; otherwise the fleet is extracted
+again and the snapshot rewritten.
+
+Requires pyarrow; without it snapshots are skipped and every run extracts
+from the database as before.
+
+Usage:
+  from device_snapshot import load_or_extract
+
+  devices = load_or_extract(conn, DEVICE_QUERY, lambda: extract_device_data(conn))
+"""
+
+import hashlib
+import json
+import os
+
+import psycopg2
+
+from device_records import DeviceRecord
+from device_extraction import build_union_query, list_device_tables
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+SNAPSHOT_FILE = os.getenv('SNAPSHOT_FILE', 'device_snapshot.arrow')
+
+# Rows per record batch, the unit in which snapshot devices are decoded
+SNAPSHOT_BATCH_ROWS = int(os.getenv('SNAPSHOT_BATCH_ROWS', '10000'))
+
+# DeviceRecord fields stored in the snapshot, with their Arrow types
+SNAPSHOT_FIELDS = [
+    ('id', 'int64'), ('hostname', 'string'), ('model', 'string'), ('device_type', 'string'),
+    ('cpu', 'string'), ('os', 'string'), ('serial', 'string'), ('site', 'string'),
+    ('source_table', 'string'),
+]
+
+# Low-cardinality columns stored dictionary-encoded
+DICTIONARY_FIELDS = {'model', 'device_type', 'cpu', 'os', 'site', 'source_table'}
+
+FINGERPRINT_QUERY = "SELECT count(*), max(updated_at)::text FROM {table}"
+
+METADATA_KEY = b'device_snapshot'
+
+
+def source_fingerprint(conn, query):
+    """Identify the current source data: the query text and per-table (row count, max updated_at)
+
+    Returns None if the tables cannot be fingerprinted (e.g. no updated_at column).
+    """
+    try:
+        tables = list_device_tables(conn)
+        with conn.cursor() as cur:
+            cur.execute(build_union_query(conn, tables, FINGERPRINT_QUERY) if tables else "SELECT 1 WHERE false")
+            table_state = {table: [count, updated_at] for count, updated_at, table in cur.fetchall()}
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Snapshot fingerprint error: {e}")
+        return None
+    return {
+        'query': hashlib.sha256(query.encode('utf-8')).hexdigest(),
+        'tables': table_state
+    }
+
+
+def _column(values, arrow_type, dictionary):
+    """Arrow array for one field, dictionary-encoded if requested"""
+    array = pa.array(values, type=pa.int64() if arrow_type == 'int64' else pa.string())
+    return array.dictionary_encode() if dictionary else array
+
+
+def save_snapshot(devices, fingerprint, filename=SNAPSHOT_FILE):
+    """Write DeviceRecords to an Arrow IPC file tagged with the source fingerprint"""
+    if pa is None or fingerprint is None:
+        return False
+    columns = {
+        field: _column([getattr(device, field) for device in devices], arrow_type, field in DICTIONARY_FIELDS)
+        for field, arrow_type in SNAPSHOT_FIELDS
+    }
+    table = pa.table(columns).replace_schema_metadata({METADATA_KEY: json.dumps(fingerprint)})
+    temp_filename = f"{filename}.tmp"
+    with pa.OSFile(temp_filename, 'wb') as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=SNAPSHOT_BATCH_ROWS)
+    os.replace(temp_filename, filename)
+    print(f"Saved snapshot of {len(devices)} devices to {filename}")
+    return True
+
+
+def read_snapshot_table(filename=SNAPSHOT_FILE):
+    """Memory-map a snapshot; returns (fingerprint, Arrow table) or (None, None)"""
+    if pa is None or not os.path.exists(filename):
+        return None, None
+    try:
+        table = pa.ipc.open_file(pa.memory_map(filename, 'r')).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        print(f"Snapshot read error: {e}")
+        return None, None
+    metadata = table.schema.metadata or {}
+    if METADATA_KEY not in metadata:
+        return None, None
+    return json.loads(metadata[METADATA_KEY]), table
+
+
+def _array_values(array):
+    """Python values of an array, decoding dictionary arrays through their dictionary
+
+    Decoding each distinct string once is much faster than to_pylist() and
+    makes repeated values share one string object.
+    """
+    if pa.types.is_dictionary(array.type):
+        dictionary = array.dictionary.to_pylist()
+        return [None if index is None else dictionary[index] for index in array.indices.to_pylist()]
+    return array.to_pylist()
+
+
+class SnapshotDevices:
+    """The DeviceRecords of a memory-mapped snapshot table, decoded as they are consumed
+
+    Each pass over the devices decodes them again, one record batch at a
+    time; len() and indexing decode nothing beyond the rows asked for.
+    """
+
+    def __init__(self, table):
+        self._table = table
+
+    def __len__(self):
+        return self._table.num_rows
+
+    def __iter__(self):
+        for batch in self._table.to_batches():
+            columns = [_array_values(batch.column(field)) for field, _ in SNAPSHOT_FIELDS]
+            yield from (DeviceRecord(*values) for values in zip(*columns))
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return DeviceRecord(*(self._table.column(field)[index].as_py() for field, _ in SNAPSHOT_FIELDS))
+
+
+def load_snapshot(fingerprint, filename=SNAPSHOT_FILE):
+    """SnapshotDevices from the snapshot if it matches the fingerprint, else None"""
+    if fingerprint is None:
+        return None
+    saved, table = read_snapshot_table(filename)
+    if saved != fingerprint:
+        return None
+    return SnapshotDevices(table)
+
+
+def load_or_extract(conn, query, extract, filename=SNAPSHOT_FILE):
+    """Reuse the snapshot while the source is unchanged, otherwise extract and save a new one"""
+    if pa is None:
+        print("pyarrow is not installed; extracting without a snapshot")
+        return extract()
+
+    fingerprint = source_fingerprint(conn, query)
+    devices = load_snapshot(fingerprint, filename)
+    if devices is not None:
+        print(f"Loaded {len(devices)} devices from snapshot {filename}")
+        return devices
+
+    devices = extract()
+    if devices:
+        save_snapshot(devices, fingerprint, filename)
+    return devices
@@ -0,0 +1,127 @@
+"""
+Device Staleness Report
+
+Histograms of how long ago each device last checked in ("Last Seen" in the
+site exports, last_seen in the site tables), per site and per category,
+built in the same pass that categorizes the devices. The stalest devices are
+kept in a bounded heap, so memory does not grow with the fleet.
+
+Timestamps without a timezone (the site tables' TIMESTAMP columns) are taken
+as UTC.
+
+Usage:
+  from device_staleness import StalenessReport
+
+  staleness = StalenessReport()
+  for device in devices:
+      staleness.add(device, categorize_device_strict(device))
+  staleness.write()
+"""
+
+import heapq
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+STALENESS_REPORT_FILE = 'staleness_report.json'
+
+# Stalest devices listed in the report
+STALE_TOP_N = int(os.getenv('STALE_TOP_N', '50'))
+
+# (bucket, upper bound of the time since last seen), in order
+STALENESS_BUCKETS = [
+    ('<1d', timedelta(days=1)),
+    ('<7d', timedelta(days=7)),
+    ('<30d', timedelta(days=30)),
+]
+OLDER_BUCKET = 'older'
+NEVER_BUCKET = 'never_seen'
+
+BUCKET_NAMES = [name for name, _ in STALENESS_BUCKETS] + [OLDER_BUCKET, NEVER_BUCKET]
+
+
+def staleness_bucket(age):
+    """Bucket name for the time since a device was last seen, or NEVER_BUCKET for None"""
+    if age is None:
+        return NEVER_BUCKET
+    for name, limit in STALENESS_BUCKETS:
+        if age < limit:
+            return name
+    return OLDER_BUCKET
+
+
+class StalenessReport:
+    """Per-site, per-category staleness histograms and the top-N stalest devices"""
+
+    def __init__(self, top_n=STALE_TOP_N, now=None):
+        self.top_n = top_n
+        self.now = now or datetime.now(timezone.utc)
+        self.sites = {}
+        self.totals = dict.fromkeys(BUCKET_NAMES, 0)
+        self.devices = 0
+        # Min-heap on -timestamp: the least stale of the kept devices is on top
+        self._stalest = []
+        self._sequence = 0
+
+    def add(self, device, category):
+        """Count one device; a single call per device keeps the report one-pass"""
+        last_seen = device.last_seen
+        if last_seen is not None and last_seen.tzinfo is None:
+            last_seen = last_seen.replace(tzinfo=timezone.utc)
+        bucket = staleness_bucket(None if last_seen is None else self.now - last_seen)
+
+        site = device.site or device.source_table or ''
+        categories = self.sites.get(site)
+        if categories is None:
+            categories = self.sites[site] = {}
+        histogram = categories.get(category)
+        if histogram is None:
+            histogram = categories[category] = dict.fromkeys(BUCKET_NAMES, 0)
+        histogram[bucket] += 1
+        self.totals[bucket] += 1
+        self.devices += 1
+
+        if last_seen is None or self.top_n <= 0:
+            return
+        key = -last_seen.timestamp()
+        if len(self._stalest) < self.top_n:
+            self._sequence += 1
+            heapq.heappush(self._stalest, (key, self._sequence, self._entry(device, category, last_seen)))
+        elif key > self._stalest[0][0]:
+            self._sequence += 1
+            heapq.heapreplace(self._stalest, (key, self._sequence, self._entry(device, category, last_seen)))
+
+    def _entry(self, device, category, last_seen):
+        """Report row for one of the stalest devices"""
+        return {
+            'hostname': device.hostname,
+            'site': device.site,
+            'source_table': device.source_table,
+            'id': device.id,
+            'category': category,
+            'last_seen': last_seen.isoformat(),
+            'days_since_seen': round((self.now - last_seen).total_seconds() / 86400, 1)
+        }
+
+    def stalest(self):
+        """The kept devices, stalest first"""
+        return [entry for _, _, entry in sorted(self._stalest, reverse=True)]
+
+    def as_dict(self):
+        return {
+            'generated_at': self.now.isoformat(),
+            'devices': self.devices,
+            'buckets': BUCKET_NAMES,
+            'totals': self.totals,
+            'sites': {site: self.sites[site] for site in sorted(self.sites)},
+            'stalest_devices': self.stalest()
+        }
+
+    def write(self, filename=STALENESS_REPORT_FILE):
+        """Print the fleet totals and write the report as JSON"""
+        print("\n=== Device Staleness (time since last seen) ===")
+        for bucket in BUCKET_NAMES:
+            print(f"{bucket}: {self.totals[bucket]} devices")
+        with open(filename, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2)
+        print(f"Exported staleness report to {filename}")
@@ -0,0 +1,89 @@
+"""
+Device Category Write-back
+
+Pushes detected categories back into the `<site>_device_inventory` tables so
+the app can read them directly. Results are loaded in one COPY into a
+temporary table, then applied with a single `UPDATE ... FROM` per site table
+instead of one UPDATE per device. Rows whose stored category already matches
+are skipped, so the updated_at trigger only fires for real changes.
+
+Usage:
+  from device_writeback import write_back_categories
+
+  updated = write_back_categories(conn, [('aam_device_inventory', 42, 'Desktop')])
+"""
+
+import csv
+import io
+import os
+
+import psycopg2
+from psycopg2 import sql
+
+# Column the detected category is written to in each site table
+CATEGORY_COLUMN = os.getenv('CATEGORY_COLUMN', 'device_category')
+
+CATEGORY_COLUMNS_QUERY = """
+    SELECT table_name FROM information_schema.columns
+    WHERE column_name = %s AND table_name = ANY(%s)
+"""
+
+
+def ensure_category_column(cur, tables, column=CATEGORY_COLUMN):
+    """Add the category column to the tables that do not have it yet"""
+    cur.execute(CATEGORY_COLUMNS_QUERY, (column, list(tables)))
+    existing = {record[0] for record in cur.fetchall()}
+    for table in sorted(set(tables) - existing):
+        print(f"Adding {column} column to table: {table}")
+        cur.execute(sql.SQL("ALTER TABLE {} ADD COLUMN IF NOT EXISTS {} VARCHAR(50)").format(
+            sql.Identifier(table), sql.Identifier(column)
+        ))
+
+
+def write_back_categories(conn, assignments, column=CATEGORY_COLUMN):
+    """Write (source_table, id, category) results back to the site tables
+
+    Everything runs in one transaction. Returns the number of rows updated
+    per table, or None if the write-back failed and was rolled back.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    tables = set()
+    for table, device_id, category in assignments:
+        writer.writerow((table, device_id, category))
+        tables.add(table)
+    if not tables:
+        return {}
+    buffer.seek(0)
+
+    updated = {}
+    try:
+        with conn.cursor() as cur:
+            ensure_category_column(cur, tables, column)
+            cur.execute("""
+                CREATE TEMP TABLE device_category_updates (
+                    source_table TEXT, id INTEGER, category VARCHAR(50)
+                ) ON COMMIT DROP
+            """)
+            cur.copy_expert(
+                "COPY device_category_updates (source_table, id, category) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+            cur.execute("CREATE INDEX ON device_category_updates (source_table, id)")
+            cur.execute("ANALYZE device_category_updates")
+
+            for table in sorted(tables):
+                cur.execute(sql.SQL("""
+                    UPDATE {table} AS d SET {column} = u.category
+                    FROM device_category_updates AS u
+                    WHERE u.source_table = %s AND d.id = u.id
+                      AND d.{column} IS DISTINCT FROM u.category
+                """).format(table=sql.Identifier(table), column=sql.Identifier(column)), (table,))
+                updated[table] = cur.rowcount
+                print(f"Updated {cur.rowcount} categories in table: {table}")
+        conn.commit()
+        return updated
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Category write-back error: {e}")
+        return None
@@ -9,23 +9,96 @@ This script specifically addresses the issue of incorrect server counts by:
 4. Creating a CSV report of device categorizations
 
 Usage:
-  python fix_server_counts.py
+  python fix_server_counts.py [--stream] [--bulk] [--db-workers N] [--itersize N]
+                              [--incremental] [--workers N] [--gzip] [--write-back]
+                              [--count-only] [--summary-only] [--dedupe]
+                              [--fuzzy-duplicates] [--staleness] [--check-sql-parity]
+                              [--metrics] [--profile] [--trace-memory]
+                              [--sites-dir [DIR]] [--watch [SECONDS]] [--snapshot [FILE]]
+
+  --stream streams rows from the database through server-side cursors and
+  writes the CSV report as devices are categorized, keeping memory flat.
+  --bulk reads all site tables through one UNION ALL statement instead of one
+  query per table.
+  --db-workers runs the per-table queries concurrently over a connection pool.
+  --incremental recategorizes only rows whose updated_at moved past the
+  per-table watermark saved by the previous run, and merges them into the
+  existing CSV report and summary. Rows with a NULL updated_at are
+  recategorized on every incremental run.
+  --workers categorizes the extracted fleet in N worker processes.
+  --gzip writes device_categories.csv.gz instead of a plain CSV report.
+  --write-back stores each detected category in the device_category column
+  of its site table (added if missing), in bulk, skipping unchanged rows.
+  --count-only evaluates the strict rules in PostgreSQL and writes per-site
+  and per-category counts to category_summary.json without fetching rows;
+  only rows with non-ASCII text are categorized in Python.
+  --summary-only categorizes the device stream in Python but keeps only
+  per-category and per-site counters and a reservoir sample of hostnames,
+  refreshing category_summary.json in constant memory (no CSV report).
+  --dedupe joins devices sharing a normalized serial number or MAC address
+  across sites (hash indexes, one pass) and categorizes only the most
+  recently seen one of each group; the groups go to duplicate_devices.json.
+  --fuzzy-duplicates reports likely duplicates whose hostnames differ only
+  slightly ("ACC4-800" vs "ACC4800") and whose models agree, per site, to
+  fuzzy_duplicates.json. Candidates are found through hostname prefix and
+  suffix blocks, so only neighbors within a block are compared.
+  --staleness also reads last_seen and writes per-site, per-category
+  histograms of the time since each device was last seen (<1d, <7d, <30d,
+  older, never) and the stalest devices to staleness_report.json, in the
+  same pass as the categorization.
+  --check-sql-parity compares the SQL rules with the Python rules row by row.
+  --metrics writes per-stage timings, rows/sec and a histogram of the rule
+  that decided each device to run_metrics.json; --profile and --trace-memory
+  add cProfile and tracemalloc reports.
+  --sites-dir categorizes the per-site CSV exports in backend/sitesData (or
+  DIR) offline, parsing the files in parallel; combine with --stream to write
+  the report while the files are read.
+  --watch polls the site exports (--sites-dir, default backend/sitesData)
+  and re-reads only files whose size/mtime and content hash changed; the
+  CSV report and category_summary.json are rebuilt from cached per-file
+  results after each change.
+  --snapshot saves the extracted fleet to an Arrow file (requires pyarrow)
+  and memory-maps it on later runs while every table's row count and
+  max(updated_at) are unchanged, skipping the full extraction.
 
 Dependencies:
   - psycopg2
-  - pandas
   - dotenv
 """
 
 import os
 import sys
+import argparse
 import re
 import json
 import csv
+import gzip
+import random
+import time
+from functools import lru_cache
+from collections import Counter
 import psycopg2
-import pandas as pd
 from datetime import datetime
 from dotenv import load_dotenv
+from categorization_engine import memoized_categorizer, cache_summary, categorize_in_processes
+from psycopg2.pool import ThreadedConnectionPool
+from device_export import CategorizedCsvWriter
+from device_records import DeviceRecord
+from device_writeback import write_back_categories
+from run_metrics import metrics
+from site_exports import (
+    SITES_DATA_DIR, changed_site_exports, parse_last_seen, read_site_exports, stream_site_exports
+)
+from device_snapshot import SNAPSHOT_FILE, load_or_extract
+from device_staleness import StalenessReport
+from device_dedupe import (
+    dedupe_devices, find_duplicate_ids, skip_duplicates, write_duplicate_report,
+    find_fuzzy_duplicates, write_fuzzy_report
+)
+from device_extraction import (
+    EXTRACT_ITERSIZE, EXTRACT_WORKERS, build_union_query, list_device_tables,
+    stream_device_rows, stream_bulk_device_rows, stream_parallel_device_rows
+)
 
 # Load environment variables
 load_dotenv()
@@ -45,6 +118,51 @@ LAPTOP_INDICATORS = ['laptop', 'notebook', 'thinkpad', 'latitude', 'macbook', 'p
 PHONE_INDICATORS = ['phone', 'iphone', 'samsung', 'android', 'mobile', 'pixel', 'galaxy']
 LICENSE_INDICATORS = ['license', 'lic', 'dlalion']
 
+CATEGORIES = [
+    'Server-Physical', 'Server-VM', 'Cell-phones-ATT', 'Cell-phones-Verizon',
+    'Cell-phones-Other', 'DLALION-License', 'Desktop', 'Laptop', 'Other'
+]
+
+# Number of example devices kept per category in streaming mode
+SAMPLE_SIZE = 5
+
+# Seconds between checks of the site exports in watch mode
+WATCH_INTERVAL = float(os.getenv('WATCH_INTERVAL', '5'))
+
+DEVICE_FIELDS = ['id', 'hostname', 'model', 'device_type', 'cpu', 'os', 'serial', 'site', 'source_table']
+
+DEVICE_QUERY = """
+    SELECT id, device_hostname, device_model, device_type, device_cpu, 
+           operating_system, serial_number, site_name
+    FROM {table}
+"""
+
+# DEVICE_QUERY plus last_seen, read for the staleness report. last_seen is
+# TIMESTAMP in the site tables but VARCHAR in device_inventory, so it is read
+# as text and parsed in Python.
+LAST_SEEN_DEVICE_QUERY = """
+    SELECT id, device_hostname, device_model, device_type, device_cpu, 
+           operating_system, serial_number, site_name, last_seen::text
+    FROM {table}
+"""
+
+# Per-table (updated_at, id) watermarks for incremental runs
+WATERMARK_FILE = 'device_watermarks.json'
+
+CHANGED_DEVICE_QUERY = """
+    SELECT id, device_hostname, device_model, device_type, device_cpu, 
+           operating_system, serial_number, site_name, updated_at
+    FROM {table}
+    WHERE updated_at IS NULL OR (updated_at, id) > (%s, %s)
+    ORDER BY updated_at, id
+"""
+
+ALL_DEVICE_QUERY = """
+    SELECT id, device_hostname, device_model, device_type, device_cpu, 
+           operating_system, serial_number, site_name, updated_at
+    FROM {table}
+"""
+
 def connect_to_db():
     """Connect to PostgreSQL database"""
     try:
@@ -60,171 +178,604 @@ def connect_to_db():
         print(f"Database connection error: {e}")
         return None
 
-def extract_device_data(conn):
+def connect_pool(size):
+    """Create a thread-safe pool of database connections"""
+    try:
+        return ThreadedConnectionPool(
+            1, size,
+            host=DB_HOST,
+            database=DB_NAME,
+            user=DB_USER,
+            password=DB_PASS,
+            port=DB_PORT
+        )
+    except psycopg2.Error as e:
+        print(f"Database connection error: {e}")
+        return None
+
+def device_with_last_seen(*row, source_table=None):
+    """DeviceRecord from a LAST_SEEN_DEVICE_QUERY row, with last_seen parsed to a datetime or None"""
+    return DeviceRecord(*row[:-1], source_table=source_table, last_seen=parse_last_seen(row[-1]))
+
+def extract_device_data(conn, bulk=False, workers=EXTRACT_WORKERS, query=DEVICE_QUERY, record_type=DeviceRecord):
     """Extract device data from database"""
     try:
+        if bulk or workers > 1:
+            return list(stream_device_data(conn, bulk=bulk, workers=workers, query=query, record_type=record_type))
+        
         data = []
+        # Get a list of device inventory tables
+        with metrics.stage('table_discovery') as stage:
+            tables = list_device_tables(conn)
+            stage.rows = len(tables)
+        
         with conn.cursor() as cur:
-            # Get a list of device inventory tables
-            cur.execute("""
-                SELECT table_name FROM information_schema.tables
-                WHERE table_name LIKE '%_device_inventory' OR table_name = 'device_inventory'
-            """)
-            tables = [record[0] for record in cur.fetchall()]
-            
             # For each table, extract device data
             for table in tables:
                 print(f"Extracting data from table: {table}")
-                cur.execute(f"""
-                    SELECT id, device_hostname, device_model, device_type, device_cpu, 
-                           operating_system, serial_number, site_name
-                    FROM {table}
-                """)
+                cur.execute(query.format(table=table))
                 rows = cur.fetchall()
                 for row in rows:
-                    id, hostname, model, device_type, cpu, os, serial, site = row
-                    data.append({
-                        'id': id,
-                        'hostname': hostname,
-                        'model': model,
-                        'device_type': device_type,
-                        'cpu': cpu,
-                        'os': os,
-                        'serial': serial,
-                        'site': site,
-                        'source_table': table
-                    })
+                    data.append(record_type(*row, source_table=table))
         return data
     except Exception as e:
         print(f"Data extraction error: {e}")
         return []
 
+def stream_device_data(conn, itersize=EXTRACT_ITERSIZE, bulk=False, workers=EXTRACT_WORKERS,
+                       query=DEVICE_QUERY, record_type=DeviceRecord):
+    """Stream device rows from database as DeviceRecords"""
+    if bulk:
+        return stream_bulk_device_rows(conn, query, record_type, itersize=itersize)
+    if workers > 1:
+        pool = connect_pool(workers)
+        if pool:
+            return stream_parallel_device_rows(conn, pool, query, record_type, workers=workers)
+    return stream_device_rows(conn, query, record_type, itersize=itersize)
+
 def categorize_device_strict(device):
     """Strict categorization function that aims for higher accuracy"""
+    fields = strict_fields(device)
+    if metrics.enabled:
+        metrics.count_rule(strict_rule(*fields))
+    return _categorize_strict_fields(*fields)
+
+def strict_fields(device):
+    """Normalized (hostname, model, device_type, cpu, os) read by categorize_device_strict"""
+    if isinstance(device, DeviceRecord):
+        return device.normalized
+    
     hostname = str(device.get('hostname', '')).lower() if device.get('hostname') else ''
     model = str(device.get('model', '')).lower() if device.get('model') else ''
     device_type = str(device.get('device_type', '')).lower() if device.get('device_type') else ''
     cpu = str(device.get('cpu', '')).lower() if device.get('cpu') else ''
     os = str(device.get('os', '')).lower() if device.get('os') else ''
     
-    # Check for VM indicators first as they override other categorizations
-    for indicator in VM_INDICATORS:
-        if (indicator in hostname or indicator in model or 
-            indicator in device_type or indicator in cpu or indicator in os):
-            return 'Server-VM'
-
-    # Check for physical server indicators, but exclude VM indicators
-    server_match = False
-    for indicator in SERVER_INDICATORS:
-        if (indicator in hostname or indicator in model or 
-            indicator in device_type or indicator in cpu or indicator in os):
-            server_match = True
-            break
-    
-    if server_match:
-        # Double check we're not misclassifying a VM
-        for indicator in VM_INDICATORS:
-            if (indicator in hostname or indicator in model or 
-                indicator in device_type or indicator in cpu or indicator in os):
-                return 'Server-VM'
-        return 'Server-Physical'
-    
-    # Check for license
-    for indicator in LICENSE_INDICATORS:
-        if (indicator in hostname or indicator in model or indicator in device_type):
-            return 'DLALION-License'
-    
-    # Check for AT&T cell phones
-    if any(indicator in device_type or indicator in model or indicator in hostname for indicator in PHONE_INDICATORS):
-        if 'att' in hostname or 'att' in model or 'att' in device_type:
-            return 'Cell-phones-ATT'
-    
-    # Check for Verizon cell phones 
-    if any(indicator in device_type or indicator in model or indicator in hostname for indicator in PHONE_INDICATORS):
-        if any(carrier in hostname or carrier in model or carrier in device_type for carrier in ['verizon', 'vzw']):
-            return 'Cell-phones-Verizon'
-    
-    # Check for generic phones not matching carrier
-    if any(indicator in device_type or indicator in model or indicator in hostname for indicator in PHONE_INDICATORS):
-        return 'Cell-phones-Other'
-    
-    # Check for laptops
-    for indicator in LAPTOP_INDICATORS:
-        if (indicator in hostname or indicator in model or indicator in device_type):
-            return 'Laptop'
-    
-    # Check for desktops
-    for indicator in DESKTOP_INDICATORS:
-        if (indicator in hostname or indicator in model or indicator in device_type):
-            return 'Desktop'
-    
-    # Default category if no specific match is found
+    return hostname, model, device_type, cpu, os
+
+ALL_FIELDS = ('hostname', 'model', 'device_type', 'cpu', 'os')
+NAME_FIELDS = ('hostname', 'model', 'device_type')
+
+# The strict rules in priority order: a device gets the first category whose
+# (indicators, fields) conditions all hold, where a condition holds if any
+# indicator occurs in any of its fields. The SQL CASE is compiled from the same
+# table.
+STRICT_SQL_RULES = [
+    ('Server-VM', [(VM_INDICATORS, ALL_FIELDS)]),
+    ('Server-Physical', [(SERVER_INDICATORS, ALL_FIELDS)]),
+    ('DLALION-License', [(LICENSE_INDICATORS, NAME_FIELDS)]),
+    ('Cell-phones-ATT', [(PHONE_INDICATORS, NAME_FIELDS), (['att'], NAME_FIELDS)]),
+    ('Cell-phones-Verizon', [(PHONE_INDICATORS, NAME_FIELDS), (['verizon', 'vzw'], NAME_FIELDS)]),
+    ('Cell-phones-Other', [(PHONE_INDICATORS, NAME_FIELDS)]),
+    ('Laptop', [(LAPTOP_INDICATORS, NAME_FIELDS)]),
+    ('Desktop', [(DESKTOP_INDICATORS, NAME_FIELDS)]),
+]
+
+def _categorize_strict_fields(hostname, model, device_type, cpu, os):
+    """Strict categorization from the normalized fields of a device
+    
+    Hostnames are unique per device, so only the work on the other fields is
+    memoized (see _strict_hostname_plan); the hostname is then matched against
+    the few rules that plan leaves open.
+    """
+    for category, searches in _strict_hostname_plan(model, device_type, cpu, os):
+        for search in searches:
+            if not search(hostname):
+                break
+        else:
+            return category
     return 'Other'
 
-def analyze_categorization(devices):
-    """Analyze and categorize all devices"""
-    categories = {
-        'Server-Physical': [],
-        'Server-VM': [],
-        'Cell-phones-ATT': [],
-        'Cell-phones-Verizon': [],
-        'Cell-phones-Other': [],
-        'DLALION-License': [],
-        'Desktop': [],
-        'Laptop': [],
-        'Other': []
-    }
+@memoized_categorizer
+def _strict_hostname_plan(model, device_type, cpu, os):
+    """The STRICT_SQL_RULES still open given every field but the hostname
+    
+    Returns (category, hostname searches) pairs in priority order: a device gets
+    the first category whose searches all match its hostname. The plan stops at
+    the first rule the other fields meet on their own.
+    """
+    values = {'model': model, 'device_type': device_type, 'cpu': cpu, 'os': os}
+    plan = []
+    for category, conditions in STRICT_SQL_RULES:
+        searches = []
+        for indicators, fields in conditions:
+            if any(indicator in values[field] for indicator in indicators
+                   for field in fields if field != 'hostname'):
+                continue
+            if 'hostname' not in fields:
+                break
+            searches.append(_indicator_search(tuple(indicators)))
+        else:
+            plan.append((category, tuple(searches)))
+            if not searches:
+                break
+    return tuple(plan)
+
+@lru_cache(maxsize=None)
+def _indicator_search(indicators):
+    """Compiled search for any of the indicators as a substring"""
+    return re.compile('|'.join(re.escape(indicator) for indicator in indicators)).search
+
+# SQL columns holding the fields read by categorize_device_strict
+STRICT_SQL_COLUMNS = {
+    'hostname': 'device_hostname', 'model': 'device_model', 'device_type': 'device_type',
+    'cpu': 'device_cpu', 'os': 'operating_system'
+}
+
+# Rows with non-ASCII text may lowercase differently in PostgreSQL and Python,
+# so they are categorized in Python instead
+AMBIGUOUS_CONDITION = "concat({columns}) ~ '[^\\x01-\\x7f]'".format(
+    columns=', '.join(STRICT_SQL_COLUMNS.values())
+)
+
+def strict_rule(hostname, model, device_type, cpu, os):
+    """Describe which STRICT_SQL_RULES entry decides a device, e.g. "Server-VM: 'vm' in hostname"
+    
+    Used for the rule-hit histogram.
+    """
+    values = {'hostname': hostname, 'model': model, 'device_type': device_type, 'cpu': cpu, 'os': os}
+    for category, conditions in STRICT_SQL_RULES:
+        hits = []
+        for indicators, fields in conditions:
+            hit = next((f"'{indicator}' in {field}" for indicator in indicators
+                        for field in fields if indicator in values[field]), None)
+            if hit is None:
+                break
+            hits.append(hit)
+        else:
+            return f"{category}: {' and '.join(hits)}"
+    return 'Other: no indicator'
+
+def _like_pattern(indicator):
+    """Substring ILIKE pattern for an indicator, with LIKE wildcards escaped"""
+    escaped = indicator.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return f"%{escaped}%"
+
+def compile_strict_case(rules=STRICT_SQL_RULES):
+    """Compile the strict rule tables into a SQL CASE expression
+    
+    Returns (expression, params); indicator lists are passed as named array
+    parameters matched with ILIKE ANY.
+    """
+    params = {}
+    branches = []
+    for rule_index, (category, conditions) in enumerate(rules):
+        clauses = []
+        for condition_index, (indicators, fields) in enumerate(conditions):
+            name = f"rule{rule_index}_{condition_index}"
+            params[name] = [_like_pattern(indicator) for indicator in indicators]
+            clauses.append('(' + ' OR '.join(
+                f"coalesce({STRICT_SQL_COLUMNS[field]}, '') ILIKE ANY(%({name})s)" for field in fields
+            ) + ')')
+        params[f"category{rule_index}"] = category
+        branches.append(f"WHEN {' AND '.join(clauses)} THEN %(category{rule_index})s")
+    expression = "CASE " + "\n         ".join(branches) + " ELSE 'Other' END"
+    return expression, params
+
+STRICT_CASE_SQL, STRICT_CASE_PARAMS = compile_strict_case()
+
+SQL_CATEGORY_QUERY = f"""
+    SELECT coalesce(site_name, '') AS site, {STRICT_CASE_SQL} AS category
+    FROM {{table}}
+    WHERE NOT ({AMBIGUOUS_CONDITION})
+"""
+
+AMBIGUOUS_DEVICE_QUERY = DEVICE_QUERY + f"    WHERE {AMBIGUOUS_CONDITION}\n"
+
+SQL_PARITY_QUERY = f"""
+    SELECT id, device_hostname, device_model, device_type, device_cpu,
+           operating_system, serial_number, site_name, {STRICT_CASE_SQL} AS category
+    FROM {{table}}
+    WHERE NOT ({AMBIGUOUS_CONDITION})
+"""
+
+def count_categories_in_sql(conn, itersize=EXTRACT_ITERSIZE):
+    """Count devices per site and category with the rules evaluated in PostgreSQL
+    
+    One GROUP BY statement covers every site table; only ambiguous rows are
+    fetched and categorized in Python. Sites are keyed by site_name, falling
+    back to the source table. Returns {site: {category: count}}.
+    """
+    site_counts = {}
+    try:
+        tables = list_device_tables(conn)
+        if not tables:
+            return site_counts
+        union = build_union_query(conn, tables, SQL_CATEGORY_QUERY)
+        with conn.cursor() as cur:
+            cur.execute(f"""
+                SELECT source_table, site, category, count(*)
+                FROM ({union}) AS categorized
+                GROUP BY source_table, site, category
+            """, STRICT_CASE_PARAMS)
+            for table, site, category, count in cur.fetchall():
+                counts = site_counts.setdefault(site or table, {c: 0 for c in CATEGORIES})
+                counts[category] += count
+    except psycopg2.Error as e:
+        print(f"Data extraction error: {e}")
+        return site_counts
+    
+    ambiguous = 0
+    for device in stream_bulk_device_rows(conn, AMBIGUOUS_DEVICE_QUERY, DeviceRecord, itersize=itersize):
+        counts = site_counts.setdefault(device.site or device.source_table, {c: 0 for c in CATEGORIES})
+        counts[categorize_device_strict(device)] += 1
+        ambiguous += 1
+    print(f"Categorized {ambiguous} ambiguous devices in Python")
+    return site_counts
+
+def check_sql_parity(conn, itersize=EXTRACT_ITERSIZE):
+    """Compare the compiled SQL rules with categorize_device_strict on every row
+    
+    Returns the number of mismatching rows.
+    """
+    mismatches = 0
+    checked = 0
+    try:
+        tables = list_device_tables(conn)
+        if not tables:
+            return 0
+        with conn.cursor(name="sql_rule_parity") as cur:
+            cur.itersize = itersize
+            cur.execute(build_union_query(conn, tables, SQL_PARITY_QUERY), STRICT_CASE_PARAMS)
+            for row in cur:
+                device = DeviceRecord(*row[:-2], source_table=row[-1])
+                expected = categorize_device_strict(device)
+                checked += 1
+                if row[-2] != expected:
+                    mismatches += 1
+                    if mismatches <= SAMPLE_SIZE:
+                        print(f"Mismatch for {device.hostname} in {device.source_table}: "
+                              f"SQL {row[-2]}, Python {expected}")
+    except psycopg2.Error as e:
+        print(f"Data extraction error: {e}")
+    print(f"SQL rule parity: {mismatches} mismatches in {checked} devices")
+    return mismatches
+
+def print_site_counts(site_counts):
+    """Print per-site category counts followed by the fleet totals"""
+    print("\n=== Device Categories per Site ===")
+    for site in sorted(site_counts):
+        counts = site_counts[site]
+        found = ', '.join(f"{category}: {count}" for category, count in counts.items() if count)
+        print(f"{site} ({sum(counts.values())} devices): {found}")
+    totals = Counter()
+    for counts in site_counts.values():
+        totals.update(counts)
+    print_category_summary({category: totals[category] for category in CATEGORIES})
+    return totals
+
+def analyze_categorization(devices, workers=1):
+    """Analyze and categorize all devices
+    
+    With workers > 1 the categorization runs in a process pool on compact
+    field tuples; results are merged back in device order.
+    """
+    categories = {category: [] for category in CATEGORIES}
+    
+    if workers > 1:
+        print(f"Categorizing in {workers} worker processes...")
+        field_tuples = (strict_fields(device) for device in devices)
+        assigned = categorize_in_processes(field_tuples, _categorize_strict_fields, workers)
+    else:
+        assigned = (categorize_device_strict(device) for device in devices)
     
     # Categorize each device
+    for device, category in zip(devices, assigned):
+        categories[category].append(device)
+        if workers > 1 and metrics.enabled:
+            metrics.count_rule(strict_rule(*strict_fields(device)))
+    
+    print_category_summary({category: len(devices) for category, devices in categories.items()})
+    
+    return categories
+
+def stream_categorization(devices, filename='device_categories.csv', compress=False, assignments=None,
+                          staleness=None):
+    """Categorize a device stream, writing each CSV row as soon as it is categorized
+
+    Only per-category counts and the first few example devices are kept, so
+    memory stays flat regardless of fleet size. Returns (counts, examples).
+    When an `assignments` list is given, (source_table, id, category) is
+    appended to it for write-back; a `staleness` report is fed each device.
+    """
+    counts = {category: 0 for category in CATEGORIES}
+    examples = {category: [] for category in CATEGORIES}
+    
+    with CategorizedCsvWriter(filename, DEVICE_FIELDS, compress=compress) as writer:
+        for device in devices:
+            category = categorize_device_strict(device)
+            writer.writerow(device, category)
+            counts[category] += 1
+            if assignments is not None:
+                assignments.append((device.source_table, device.id, category))
+            if staleness is not None:
+                staleness.add(device, category)
+            if len(examples[category]) < SAMPLE_SIZE:
+                examples[category].append(device)
+    
+    print(f"Exported categorization data to {writer.filename}")
+    print_category_summary(counts)
+    
+    return counts, examples
+
+def summarize_categories(devices, sample_size=SAMPLE_SIZE, seed=None, staleness=None):
+    """Count a device stream per category and per site without keeping any device
+    
+    Example hostnames are reservoir-sampled, so every hostname of a category
+    is equally likely to be kept whatever the fleet size.
+    Returns (counts, site_counts, sample_hostnames).
+    """
+    counts = {category: 0 for category in CATEGORIES}
+    site_counts = {}
+    sample_hostnames = {category: [] for category in CATEGORIES}
+    hostnames_seen = Counter()
+    rng = random.Random(seed)
+    
     for device in devices:
         category = categorize_device_strict(device)
-        categories[category].append(device)
+        counts[category] += 1
+        site = device.site or device.source_table or ''
+        site_category_counts = site_counts.get(site)
+        if site_category_counts is None:
+            site_category_counts = site_counts[site] = {c: 0 for c in CATEGORIES}
+        site_category_counts[category] += 1
+        if staleness is not None:
+            staleness.add(device, category)
+        
+        hostname = device.hostname
+        if not hostname:
+            continue
+        hostnames_seen[category] += 1
+        samples = sample_hostnames[category]
+        if len(samples) < sample_size:
+            samples.append(hostname)
+        else:
+            slot = rng.randrange(hostnames_seen[category])
+            if slot < sample_size:
+                samples[slot] = hostname
     
-    # Print summary
+    return counts, site_counts, sample_hostnames
+
+def print_category_summary(counts):
+    """Print per-category counts and percentages"""
     print("\n=== Device Categorization Results ===")
-    total_devices = len(devices)
-    for category, devices in categories.items():
-        count = len(devices)
+    total_devices = sum(counts.values())
+    for category, count in counts.items():
         percentage = (count / total_devices) * 100 if total_devices > 0 else 0
         print(f"{category}: {count} devices ({percentage:.2f}%)")
+    print(cache_summary("Categorization", _strict_hostname_plan))
+
+def export_to_csv(categories, filename='device_categories.csv', compress=False):
+    """Export categorized devices to CSV, streaming rows in DEVICE_FIELDS order"""
+    if not any(categories.values()):
+        print("No data to export")
+        return
     
-    return categories
+    with CategorizedCsvWriter(filename, DEVICE_FIELDS, compress=compress) as writer:
+        for category, devices in categories.items():
+            for device in devices:
+                writer.writerow(device, category)
+    print(f"Exported categorization data to {writer.filename}")
 
-def export_to_csv(categories, filename='device_categories.csv'):
-    """Export categorized devices to CSV"""
-    all_devices = []
+def category_assignments(categories):
+    """Yield (source_table, id, category) for devices read from a site table"""
     for category, devices in categories.items():
         for device in devices:
-            device_copy = device.copy()
-            device_copy['category'] = category
-            all_devices.append(device_copy)
-    
-    if all_devices:
-        df = pd.DataFrame(all_devices)
-        df.to_csv(filename, index=False)
-        print(f"Exported categorization data to {filename}")
-    else:
-        print("No data to export")
+            if device.get('source_table'):
+                yield device.get('source_table'), device.get('id'), category
 
-def export_json_summary(categories, filename='category_summary.json'):
-    """Export category summary as JSON"""
+def export_json_summary(categories, filename='category_summary.json', counts=None):
+    """Export category summary as JSON
+    
+    When `categories` only holds example devices (streaming mode), the real
+    per-category totals are passed in `counts`.
+    """
+    if counts is None:
+        counts = {category: len(devices) for category, devices in categories.items()}
+    
+    sample_hostnames = {
+        category: [d.get('hostname') for d in devices[:SAMPLE_SIZE] if d.get('hostname')]
+        for category, devices in categories.items()
+    }
+    write_json_summary(counts, sample_hostnames, filename)
+
+def write_json_summary(counts, sample_hostnames, filename='category_summary.json', site_counts=None):
+    """Write per-category counts and sample hostnames (and per-site counts, if given) as JSON"""
     summary = {
-        'total': sum(len(devices) for devices in categories.values()),
-        'categories': {category: len(devices) for category, devices in categories.items()},
+        'total': sum(counts.values()),
+        'categories': dict(counts),
         'category_details': {
             category: {
-                'count': len(devices),
-                'sample_hostnames': [d.get('hostname') for d in devices[:5] if d.get('hostname')]
-            } for category, devices in categories.items()
+                'count': count,
+                'sample_hostnames': sample_hostnames.get(category, [])
+            } for category, count in counts.items()
         },
         'timestamp': datetime.now().isoformat()
     }
+    if site_counts is not None:
+        summary['sites'] = site_counts
     
     with open(filename, 'w') as f:
         json.dump(summary, f, indent=2)
     
     print(f"Exported summary to {filename}")
 
+def load_watermarks(filename=WATERMARK_FILE):
+    """Load per-table (updated_at, id) watermarks saved by the previous incremental run"""
+    if not os.path.exists(filename):
+        return {}
+    with open(filename) as f:
+        marks = json.load(f)
+    return {
+        table: (datetime.fromisoformat(mark['updated_at']), mark['id'])
+        for table, mark in marks.items()
+    }
+
+def save_watermarks(watermarks, filename=WATERMARK_FILE):
+    """Save per-table (updated_at, id) watermarks"""
+    with open(filename, 'w') as f:
+        json.dump({
+            table: {'updated_at': updated_at.isoformat(), 'id': id}
+            for table, (updated_at, id) in watermarks.items()
+        }, f, indent=2)
+
+def fetch_changed_devices(conn, watermarks, itersize=EXTRACT_ITERSIZE):
+    """Yield (device, updated_at) for rows changed since each table's watermark
+    
+    Tables without a watermark are read in full. Rows with a NULL updated_at
+    cannot be ordered against a watermark, so they are read on every run.
+    """
+    for table in list_device_tables(conn):
+        mark = watermarks.get(table)
+        with conn.cursor(name=f"changed_{table}") as cur:
+            cur.itersize = itersize
+            if mark:
+                cur.execute(CHANGED_DEVICE_QUERY.format(table=table), mark)
+            else:
+                cur.execute(ALL_DEVICE_QUERY.format(table=table))
+            for row in cur:
+                yield DeviceRecord(*row[:-1], source_table=table), row[-1]
+
+def merge_categorized_csv(changed, filename='device_categories.csv', has_previous=True):
+    """Rewrite the CSV report with changed rows replaced in place or appended
+    
+    `changed` maps (source_table, id) to (device, category); a filename
+    ending in .gz is read and written gzip compressed. Returns the
+    per-category count deltas, the per-(site, category) deltas and the
+    (hostname, old_category) pairs of devices that moved to another category.
+    """
+    deltas = Counter()
+    site_deltas = Counter()
+    moved = []
+    pending = dict(changed)
+    compress = filename.endswith('.gz')
+    
+    # The writer only replaces filename once the previous rows have been read
+    with CategorizedCsvWriter(filename, DEVICE_FIELDS, compress=compress) as writer:
+        if has_previous:
+            opener = gzip.open if compress else open
+            with opener(filename, 'rt', newline='', encoding='utf-8') as previous:
+                for row in csv.DictReader(previous):
+                    update = pending.pop((row.get('source_table'), row.get('id')), None)
+                    if update is None:
+                        writer.writerow(row, row['category'])
+                        continue
+                    device, category = update
+                    deltas[row['category']] -= 1
+                    deltas[category] += 1
+                    site_deltas[(row.get('site') or row.get('source_table') or '', row['category'])] -= 1
+                    site_deltas[(device.site or device.source_table or '', category)] += 1
+                    if row['category'] != category:
+                        moved.append((device.hostname, row['category']))
+                    writer.writerow(device, category)
+        
+        for device, category in pending.values():
+            deltas[category] += 1
+            site_deltas[(device.site or device.source_table or '', category)] += 1
+            writer.writerow(device, category)
+    
+    print(f"Merged {len(changed)} changed devices into {filename}")
+    return deltas, site_deltas, moved
+
+def update_json_summary(deltas, site_deltas, moved, changed, filename='category_summary.json',
+                        has_previous=True):
+    """Apply per-category and per-site deltas to the previous JSON summary
+    
+    Per-site counts are kept if the previous summary had them (--summary-only
+    and --count-only write them) and started on the first incremental run.
+    """
+    counts = {category: 0 for category in CATEGORIES}
+    sample_hostnames = {category: [] for category in CATEGORIES}
+    site_counts = {}
+    if has_previous:
+        with open(filename) as f:
+            previous = json.load(f)
+        counts.update(previous.get('categories', {}))
+        for category, details in previous.get('category_details', {}).items():
+            sample_hostnames[category] = details.get('sample_hostnames', [])
+        site_counts = previous.get('sites')
+    
+    for category, delta in deltas.items():
+        counts[category] = counts.get(category, 0) + delta
+    
+    if site_counts is not None:
+        for (site, category), delta in site_deltas.items():
+            site_category_counts = site_counts.setdefault(site, {c: 0 for c in CATEGORIES})
+            site_category_counts[category] = site_category_counts.get(category, 0) + delta
+        site_counts = {site: site_counts[site] for site in sorted(site_counts) if any(site_counts[site].values())}
+    
+    # Drop samples that moved away and top up from the changed devices
+    for hostname, old_category in moved:
+        if hostname in sample_hostnames.get(old_category, []):
+            sample_hostnames[old_category].remove(hostname)
+    for device, category in changed.values():
+        samples = sample_hostnames.setdefault(category, [])
+        if device.hostname and len(samples) < SAMPLE_SIZE and device.hostname not in samples:
+            samples.append(device.hostname)
+    
+    write_json_summary(counts, sample_hostnames, filename, site_counts=site_counts)
+    return counts
+
+def run_incremental(conn, csv_filename='device_categories.csv', summary_filename='category_summary.json',
+                    watermark_filename=WATERMARK_FILE, itersize=EXTRACT_ITERSIZE, write_back=False,
+                    compress=False):
+    """Recategorize rows changed since the last run and merge them into the previous outputs
+    
+    Deleted rows are not detected; run a full categorization to drop them.
+    Rows with a NULL updated_at are recategorized on every run.
+    """
+    if compress and not csv_filename.endswith('.gz'):
+        csv_filename = f"{csv_filename}.gz"
+    watermarks = load_watermarks(watermark_filename)
+    has_previous = bool(watermarks) and os.path.exists(csv_filename) and os.path.exists(summary_filename)
+    if not has_previous:
+        print("No previous incremental state found, categorizing all devices")
+        watermarks = {}
+    
+    changed = {}
+    new_watermarks = dict(watermarks)
+    for device, updated_at in fetch_changed_devices(conn, watermarks, itersize):
+        changed[(device.source_table, str(device.id))] = (device, categorize_device_strict(device))
+        if updated_at is not None:
+            mark = new_watermarks.get(device.source_table)
+            if mark is None or (updated_at, device.id) > mark:
+                new_watermarks[device.source_table] = (updated_at, device.id)
+    
+    print(f"{len(changed)} devices changed since the last run")
+    if not changed and has_previous:
+        return
+    
+    deltas, site_deltas, moved = merge_categorized_csv(changed, csv_filename, has_previous)
+    counts = update_json_summary(deltas, site_deltas, moved, changed, summary_filename, has_previous)
+    save_watermarks(new_watermarks, watermark_filename)
+    if write_back:
+        write_back_categories(conn, ((device.source_table, device.id, category)
+                                     for device, category in changed.values()))
+    
+    print("\n=== Category Changes ===")
+    for category in counts:
+        print(f"{category}: {counts[category]} devices ({deltas.get(category, 0):+d})")
+
 def generate_improved_js_code(categories):
     """Generate improved JavaScript categorization code based on analysis"""
     # Find patterns in hostnames, models, CPUs of physical servers
@@ -356,16 +907,313 @@ export const detectDeviceCategoryImproved = (device) => {
     
     print("Generated improved JavaScript categorization code in 'improved_categorization.js'")
 
+def parse_args():
+    """Parse command line options"""
+    parser = argparse.ArgumentParser(description="Strict device categorization and server count fixer")
+    parser.add_argument('--stream', action='store_true',
+                        help="stream rows through server-side cursors instead of loading the fleet")
+    parser.add_argument('--bulk', action='store_true',
+                        help="read all site tables through a single UNION ALL statement")
+    parser.add_argument('--db-workers', type=int, default=EXTRACT_WORKERS,
+                        help="concurrent per-table queries over a connection pool")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="categorize in this many worker processes (default: single process)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="only recategorize rows changed since the last incremental run")
+    parser.add_argument('--gzip', action='store_true',
+                        help="write the CSV report gzip compressed")
+    parser.add_argument('--write-back', action='store_true',
+                        help="store detected categories in the site device tables")
+    parser.add_argument('--count-only', action='store_true',
+                        help="only refresh counts, with the rules evaluated in PostgreSQL")
+    parser.add_argument('--summary-only', action='store_true',
+                        help="only refresh category_summary.json, counting the device stream in constant memory")
+    parser.add_argument('--dedupe', action='store_true',
+                        help="count devices listed at several sites (same serial or MAC) once")
+    parser.add_argument('--fuzzy-duplicates', action='store_true',
+                        help="report likely duplicates with similar hostnames and models per site")
+    parser.add_argument('--staleness', action='store_true',
+                        help="write per-site, per-category last-seen histograms to staleness_report.json")
+    parser.add_argument('--check-sql-parity', action='store_true',
+                        help="compare the SQL rule expression with the Python rules")
+    parser.add_argument('--itersize', type=int, default=EXTRACT_ITERSIZE,
+                        help="rows fetched per round trip in streaming mode")
+    parser.add_argument('--sites-dir', nargs='?', const=SITES_DATA_DIR,
+                        help="categorize the site CSV exports in this directory instead of the database "
+                             "(default: backend/sitesData)")
+    parser.add_argument('--watch', nargs='?', type=float, const=WATCH_INTERVAL, metavar='SECONDS',
+                        help="keep polling the site exports and recategorize changed files "
+                             f"(default: every {WATCH_INTERVAL:g} seconds)")
+    parser.add_argument('--snapshot', nargs='?', const=SNAPSHOT_FILE,
+                        help="reuse a columnar snapshot of the extracted fleet while the tables are unchanged "
+                             "(default file: device_snapshot.arrow)")
+    parser.add_argument('--metrics', action='store_true',
+                        help="write per-stage timings and rule hits to run_metrics.json")
+    parser.add_argument('--profile', action='store_true',
+                        help="include a cProfile report in run_metrics.json (implies --metrics)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="include a tracemalloc report in run_metrics.json (implies --metrics)")
+    args = parser.parse_args()
+    if args.watch is not None and args.watch <= 0:
+        parser.error("--watch interval must be positive")
+    return args
+
 def main():
     """Main function"""
+    args = parse_args()
+    if args.metrics or args.profile or args.trace_memory:
+        metrics.enable(profile=args.profile, trace_memory=args.trace_memory)
+    try:
+        run(args)
+    except psycopg2.Error as e:
+        # Raised mid-stream: nothing was summarized or written back from a partial fleet
+        print(f"Data extraction error: {e}")
+        sys.exit(1)
+    finally:
+        metrics.write()
+
+def run_summary_only(devices, staleness=None):
+    """Refresh category_summary.json from a device stream; no CSV report or JS is written"""
+    with metrics.stage('summary') as stage:
+        counts, site_counts, sample_hostnames = summarize_categories(devices, staleness=staleness)
+        stage.rows = sum(counts.values())
+    if not sum(counts.values()):
+        print("No device data found. Exiting.")
+        return
+    print_site_counts(site_counts)
+    write_json_summary(counts, sample_hostnames, site_counts=site_counts)
+    if staleness is not None:
+        staleness.write()
+
+def write_staleness_report(staleness, categories=None):
+    """Write the staleness report, first feeding it the categorized fleet if given"""
+    if staleness is None:
+        return
+    if categories is not None:
+        with metrics.stage('staleness') as stage:
+            for category, devices in categories.items():
+                for device in devices:
+                    staleness.add(device, category)
+            stage.rows = staleness.devices
+    staleness.write()
+
+def report_fuzzy_duplicates(devices):
+    """Write likely near-duplicate devices, per site, to fuzzy_duplicates.json"""
+    with metrics.stage('fuzzy_duplicates') as stage:
+        matches = find_fuzzy_duplicates(devices)
+        stage.rows = len(devices)
+    write_fuzzy_report(devices, matches)
+
+def run_site_exports(args):
+    """Categorize the per-site CSV exports directly, without the database"""
+    devices = stream_site_exports(args.sites_dir)
+    staleness = StalenessReport() if args.staleness else None
+    if args.dedupe:
+        with metrics.stage('dedupe') as stage:
+            devices, groups = dedupe_devices(devices)
+            stage.rows = len(devices)
+        write_duplicate_report(groups)
+    if args.fuzzy_duplicates:
+        devices = list(devices)
+        report_fuzzy_duplicates(devices)
+    if args.summary_only:
+        run_summary_only(devices, staleness)
+        return
+    if args.stream:
+        # Ingestion, categorization and CSV export are interleaved when streaming
+        with metrics.stage('stream_ingest_categorize_export') as stage:
+            counts, examples = stream_categorization(devices, compress=args.gzip, staleness=staleness)
+            stage.rows = sum(counts.values())
+        categories = examples
+        write_staleness_report(staleness)
+    else:
+        with metrics.stage('ingestion') as stage:
+            devices = list(devices)
+            stage.rows = len(devices)
+        counts = None
+        with metrics.stage('categorization') as stage:
+            categories = analyze_categorization(devices, workers=args.workers)
+            stage.rows = len(devices)
+        with metrics.stage('csv_export') as stage:
+            export_to_csv(categories, compress=args.gzip)
+            stage.rows = len(devices)
+        write_staleness_report(staleness, categories)
+    
+    if not any(categories.values()):
+        print("No device data found. Exiting.")
+        return
+    with metrics.stage('json_summary'):
+        export_json_summary(categories, counts=counts)
+    with metrics.stage('js_codegen'):
+        generate_improved_js_code(categories)
+    print_next_steps()
+
+def categorize_site_file(devices):
+    """Categorize one site export into a partial result cached until the file changes"""
+    partial = {
+        'devices': [],
+        'counts': {category: 0 for category in CATEGORIES},
+        'site_counts': {},
+        'samples': {category: [] for category in CATEGORIES}
+    }
+    for device in devices:
+        category = categorize_device_strict(device)
+        partial['devices'].append((device, category))
+        partial['counts'][category] += 1
+        site = device.site or device.source_table or ''
+        site_counts = partial['site_counts'].setdefault(site, {c: 0 for c in CATEGORIES})
+        site_counts[category] += 1
+        samples = partial['samples'][category]
+        if device.hostname and len(samples) < SAMPLE_SIZE:
+            samples.append(device.hostname)
+    return partial
+
+def write_merged_partials(partials, compress=False):
+    """Rebuild the CSV report and category_summary.json from per-file partials, in file order"""
+    counts = {category: 0 for category in CATEGORIES}
+    site_counts = {}
+    sample_hostnames = {category: [] for category in CATEGORIES}
+    
+    with CategorizedCsvWriter('device_categories.csv', DEVICE_FIELDS, compress=compress) as writer:
+        for path in sorted(partials):
+            partial = partials[path]
+            for device, category in partial['devices']:
+                writer.writerow(device, category)
+            for category, count in partial['counts'].items():
+                counts[category] += count
+            for site, file_counts in partial['site_counts'].items():
+                merged = site_counts.setdefault(site, {c: 0 for c in CATEGORIES})
+                for category, count in file_counts.items():
+                    merged[category] += count
+            for category, samples in partial['samples'].items():
+                merged_samples = sample_hostnames[category]
+                merged_samples.extend(samples[:SAMPLE_SIZE - len(merged_samples)])
+    
+    print(f"Exported categorization data to {writer.filename}")
+    write_json_summary(counts, sample_hostnames, site_counts=site_counts)
+    return counts
+
+def run_watch(args):
+    """Poll the site exports and recategorize only the files that changed
+    
+    Each file's categorized devices and counts are cached; the combined CSV
+    report and summary are rebuilt from the cached partials after a change.
+    """
+    directory = args.sites_dir or SITES_DATA_DIR
+    known = {}
+    partials = {}
+    print(f"Watching {directory} every {args.watch:g}s (Ctrl+C to stop)")
+    try:
+        while True:
+            started = time.perf_counter()
+            changed, removed = changed_site_exports(directory, known)
+            if changed or removed:
+                for path in removed:
+                    partials.pop(path, None)
+                for path, devices in read_site_exports(changed):
+                    partials[path] = categorize_site_file(devices)
+                counts = write_merged_partials(partials, compress=args.gzip)
+                print(f"Recategorized {len(changed)} changed and dropped {len(removed)} removed site exports "
+                      f"({sum(counts.values())} devices) in {time.perf_counter() - started:.2f}s")
+            time.sleep(args.watch)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+def run(args):
+    """Run the mode selected on the command line"""
     print("=== Device Categorization Fixer ===")
+    if args.watch is not None:
+        run_watch(args)
+        return
+    if args.sites_dir:
+        run_site_exports(args)
+        return
     print("Connecting to database...")
     
     conn = connect_to_db()
+    if conn and args.check_sql_parity:
+        mismatches = check_sql_parity(conn, args.itersize)
+        conn.close()
+        sys.exit(1 if mismatches else 0)
+    
+    if conn and args.count_only:
+        print("Counting device categories in the database...")
+        with metrics.stage('sql_count'):
+            site_counts = count_categories_in_sql(conn, args.itersize)
+        conn.close()
+        totals = print_site_counts(site_counts)
+        write_json_summary({category: totals[category] for category in CATEGORIES}, {},
+                           site_counts=site_counts)
+        return
+    
+    skipped = None
+    if conn and args.dedupe:
+        if args.incremental:
+            print("--dedupe does not apply to --incremental runs")
+        else:
+            try:
+                with metrics.stage('dedupe') as stage:
+                    skipped, groups = find_duplicate_ids(conn, args.itersize)
+                    stage.rows = len(skipped)
+            except psycopg2.Error as e:
+                print(f"Dedupe extraction error: {e}")
+                conn.close()
+                sys.exit(1)
+            write_duplicate_report(groups)
+    
+    # Devices are read with last_seen when a staleness report is requested
+    staleness = StalenessReport() if args.staleness else None
+    source = {'query': LAST_SEEN_DEVICE_QUERY, 'record_type': device_with_last_seen} if staleness else {}
+    
+    if conn and args.fuzzy_duplicates and (args.summary_only or args.stream):
+        print("--fuzzy-duplicates needs the extracted fleet; run without --stream or --summary-only")
+    
+    if conn and args.summary_only:
+        print("Summarizing device categories...")
+        devices = stream_device_data(conn, args.itersize, bulk=args.bulk, workers=args.db_workers, **source)
+        run_summary_only(skip_duplicates(devices, skipped) if skipped else devices, staleness)
+        conn.close()
+        return
+    
+    if conn and args.incremental:
+        print("Recategorizing changed devices...")
+        with metrics.stage('incremental'):
+            run_incremental(conn, itersize=args.itersize, write_back=args.write_back, compress=args.gzip)
+        print(cache_summary("Categorization", _strict_hostname_plan))
+        conn.close()
+        return
+    
+    if conn and args.stream:
+        print("Streaming device data...")
+        devices = stream_device_data(conn, args.itersize, bulk=args.bulk, workers=args.db_workers, **source)
+        if skipped:
+            devices = skip_duplicates(devices, skipped)
+        assignments = [] if args.write_back else None
+        # Extraction, categorization and CSV export are interleaved when streaming
+        with metrics.stage('stream_extract_categorize_export') as stage:
+            counts, examples = stream_categorization(devices, compress=args.gzip, assignments=assignments,
+                                                     staleness=staleness)
+            stage.rows = sum(counts.values())
+        if assignments:
+            with metrics.stage('write_back') as stage:
+                write_back_categories(conn, assignments)
+                stage.rows = len(assignments)
+        conn.close()
+        if not sum(counts.values()):
+            print("No device data found. Exiting.")
+            return
+        with metrics.stage('json_summary'):
+            export_json_summary(examples, counts=counts)
+        write_staleness_report(staleness)
+        with metrics.stage('js_codegen'):
+            generate_improved_js_code(examples)
+        print_next_steps()
+        return
+    
     if not conn:
         print("Using sample data for testing since database connection failed")
         # Sample data for testing
-        devices = [
+        devices = [DeviceRecord.from_mapping(device) for device in [
             {'id': 1, 'hostname': 'srv001', 'model': 'PowerEdge R740', 'device_type': 'Server', 
              'cpu': 'Intel Xeon Gold 6248R', 'os': 'Windows Server 2019'},
             {'id': 2, 'hostname': 'desktop001', 'model': 'OptiPlex 7080', 'device_type': 'Desktop', 
@@ -376,32 +1224,58 @@ def main():
              'cpu': 'Apple A15 Bionic', 'os': 'iOS 15'},
             {'id': 5, 'hostname': 'license-srv1', 'model': 'License Server', 'device_type': 'License', 
              'cpu': 'Intel Xeon E3-1270 v6', 'os': 'Windows Server 2016'}
-        ]
+        ]]
     else:
         print("Extracting device data...")
-        devices = extract_device_data(conn)
+        with metrics.stage('extraction') as stage:
+            extract = lambda: extract_device_data(conn, bulk=args.bulk, workers=args.db_workers, **source)
+            if args.snapshot and staleness:
+                print("Snapshots do not store last_seen; extracting without the snapshot")
+            use_snapshot = args.snapshot and not staleness
+            devices = load_or_extract(conn, DEVICE_QUERY, extract, args.snapshot) if use_snapshot else extract()
+            if skipped:
+                devices = list(skip_duplicates(devices, skipped))
+            stage.rows = len(devices)
         
     if not devices:
         print("No device data found. Exiting.")
         return
     
+    if args.fuzzy_duplicates:
+        report_fuzzy_duplicates(devices)
+    
     print(f"Analyzing {len(devices)} devices...")
-    categories = analyze_categorization(devices)
+    with metrics.stage('categorization') as stage:
+        categories = analyze_categorization(devices, workers=args.workers)
+        stage.rows = len(devices)
     
     # Export data
-    export_to_csv(categories)
-    export_json_summary(categories)
+    with metrics.stage('csv_export') as stage:
+        export_to_csv(categories, compress=args.gzip)
+        stage.rows = len(devices)
+    with metrics.stage('json_summary'):
+        export_json_summary(categories)
+    write_staleness_report(staleness, categories)
+    if conn and args.write_back:
+        with metrics.stage('write_back') as stage:
+            write_back_categories(conn, category_assignments(categories))
+            stage.rows = len(devices)
     
     # Generate improved JS categorization
-    generate_improved_js_code(categories)
+    with metrics.stage('js_codegen'):
+        generate_improved_js_code(categories)
     
+    print_next_steps()
+    
+    if conn:
+        conn.close()
+
+def print_next_steps():
+    """Print instructions for using the generated files"""
     print("\nDone! Use the generated files to update your frontend code.")
     print("1. Check 'category_summary.json' for category counts")
     print("2. Review 'device_categories.csv' for detailed categorization")
     print("3. Import functions from 'improved_categorization.js' in your frontend")
-    
-    if conn:
-        conn.close()
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
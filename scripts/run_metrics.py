@@ -0,0 +1,162 @@
+"""
+Run Metrics
+
+Instrumentation for categorization runs: monotonic per-stage timers with
+rows/sec, a histogram of which categorization rule fired for each device,
+and optional cProfile / tracemalloc hooks. Everything is written to
+`run_metrics.json`.
+
+Metrics are disabled by default. While disabled, `stage()` hands back a
+shared no-op context manager and `count_rule()` returns immediately, so
+instrumented code pays one attribute check.
+
+Usage:
+  from run_metrics import metrics
+
+  metrics.enable(profile=True)
+  with metrics.stage('extraction') as stage:
+      devices = extract_device_data(conn)
+      stage.rows = len(devices)
+  metrics.write()
+"""
+
+import cProfile
+import io
+import json
+import pstats
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+METRICS_FILE = 'run_metrics.json'
+
+# Entries kept from the profiler and allocation reports
+REPORT_TOP_N = 25
+
+
+class Stage:
+    """Timer for one stage; set `rows` to report throughput"""
+
+    def __init__(self, name):
+        self.name = name
+        self.rows = None
+        self.seconds = None
+        self._started = None
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.seconds = time.perf_counter() - self._started
+
+    def as_dict(self):
+        result = {'stage': self.name, 'seconds': round(self.seconds, 4)}
+        if self.rows is not None:
+            result['rows'] = self.rows
+            result['rows_per_sec'] = round(self.rows / self.seconds) if self.seconds > 0 else None
+        return result
+
+
+class _NoStage:
+    """Stand-in returned by stage() while metrics are disabled"""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+class RunMetrics:
+    """Collects stage timings, rule hits and optional profiles for one run"""
+
+    def __init__(self):
+        self.enabled = False
+        self.stages = []
+        self.rule_hits = Counter()
+        self._profiler = None
+        self._trace_memory = False
+        self._started = None
+
+    def enable(self, profile=False, trace_memory=False):
+        """Start collecting; optionally profile with cProfile and trace allocations"""
+        self.enabled = True
+        self._started = time.perf_counter()
+        if profile:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if trace_memory:
+            self._trace_memory = True
+            tracemalloc.start()
+
+    def stage(self, name):
+        """Context manager timing one stage"""
+        if not self.enabled:
+            return _NO_STAGE
+        stage = Stage(name)
+        self.stages.append(stage)
+        return stage
+
+    def count_rule(self, rule):
+        """Record that a categorization rule decided one device"""
+        if self.enabled:
+            self.rule_hits[rule] += 1
+
+    def _profile_report(self):
+        """Top functions by cumulative time"""
+        self._profiler.disable()
+        stats = pstats.Stats(self._profiler, stream=io.StringIO()).sort_stats('cumulative')
+        report = []
+        for (filename, line, function), (_, calls, _, cumulative, _) in stats.stats.items():
+            report.append({
+                'function': f"{filename}:{line}({function})",
+                'calls': calls,
+                'cumulative_seconds': round(cumulative, 4)
+            })
+        report.sort(key=lambda entry: entry['cumulative_seconds'], reverse=True)
+        return report[:REPORT_TOP_N]
+
+    def _memory_report(self):
+        """Peak traced memory and the largest allocation sites"""
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            'current_mb': round(current / (1024 * 1024), 2),
+            'peak_mb': round(peak / (1024 * 1024), 2),
+            'top_allocations': [
+                {'location': str(statistic.traceback), 'size_kb': round(statistic.size / 1024, 1),
+                 'count': statistic.count}
+                for statistic in snapshot.statistics('lineno')[:REPORT_TOP_N]
+            ]
+        }
+
+    def write(self, filename=METRICS_FILE):
+        """Write the collected metrics as JSON"""
+        if not self.enabled:
+            return
+        report = {
+            'timestamp': datetime.now().isoformat(),
+            'total_seconds': round(time.perf_counter() - self._started, 4),
+            'stages': [stage.as_dict() for stage in self.stages if stage.seconds is not None],
+            'rule_hits': dict(self.rule_hits.most_common())
+        }
+        if self._profiler is not None:
+            report['profile'] = self._profile_report()
+        if self._trace_memory:
+            report['memory'] = self._memory_report()
+
+        with open(filename, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Exported run metrics to {filename}")
+
+
+# Process-wide metrics, disabled until enable() is called
+metrics = RunMetrics()
@@ -0,0 +1,210 @@
+"""
+Site Export Ingestion
+
+Reads the per-site device exports in backend/sitesData (Status, Site,
+Hostname, Type, Last User, OS, Serial Number, Description, Last Seen,
+MAC Address(es), Device CPU) as DeviceRecords, so the whole fleet can be
+categorized offline without going through the database.
+
+Files are parsed in a process pool, one file per task, and records are
+yielded file by file in name order as soon as each file is parsed. Headers
+are mapped to the DeviceRecord fields the same way the site migration
+scripts map them to database columns (Description is the device
+description, not its model); `Last Seen` is parsed to a datetime
+and `MAC Address(es)` to a tuple of normalized addresses once, at ingestion.
+
+Exports are replaced as whole files, so changed_site_exports detects changes
+per file: a cheap size/mtime check first, then a content hash to ignore
+files that were rewritten unchanged.
+
+Usage:
+  from site_exports import stream_site_exports
+
+  for device in stream_site_exports('../backend/sitesData'):
+      category = categorize_device_strict(device)
+"""
+
+import csv
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+
+from device_records import DeviceRecord
+
+# Default location of the site exports, relative to this script
+SITES_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'sitesData')
+
+# Concurrent file parsers (1 parses in this process)
+INGEST_WORKERS = int(os.getenv('INGEST_WORKERS', str(min(4, os.cpu_count() or 1))))
+
+# Export headers for each DeviceRecord field; the first one present in a file
+# is used (older exports such as aam.csv spell them "Device Hostname", ...)
+SITE_EXPORT_COLUMNS = {
+    'hostname': ('Hostname', 'Device Hostname'),
+    'model': ('Device Model',),
+    'device_type': ('Type', 'Device Type'),
+    'os': ('OS', 'Operating System'),
+    'serial': ('Serial Number',),
+    'site': ('Site', 'Site Name'),
+    'cpu': ('Device CPU',),
+    'description': ('Description', 'Device Description'),
+    'status': ('Status',),
+    'last_user': ('Last User',),
+}
+
+LAST_SEEN_COLUMN = 'Last Seen'
+MAC_COLUMN = 'MAC Address(es)'
+
+# Bytes read at a time when hashing an export
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Non-ISO Last Seen formats, tried in order (aam.csv uses M/D/YYYY H:MM)
+LAST_SEEN_FORMATS = ('%m/%d/%Y %H:%M', '%m/%d/%Y %H:%M:%S')
+
+# Last Seen value for devices checked in at export time
+CURRENTLY_ONLINE = 'Currently Online'
+
+
+def _parse_formatted(value):
+    """Parse a timestamp in one of LAST_SEEN_FORMATS, or None"""
+    for date_format in LAST_SEEN_FORMATS:
+        try:
+            return datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    return None
+
+
+@lru_cache(maxsize=65536)
+def parse_last_seen(value, exported_at=None):
+    """Parse an export timestamp such as 2025-03-26T23:49:45Z or 2/3/2025 23:51 (as UTC),
+    or None if missing or invalid
+
+    Exports repeat the same timestamps many times, so parses are memoized.
+    "Currently Online" maps to `exported_at`.
+    """
+    if not value:
+        return None
+    if value == CURRENTLY_ONLINE:
+        return exported_at
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        parsed = _parse_formatted(value)
+        if parsed is None:
+            return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_mac_addresses(value):
+    """Split a MAC Address(es) cell into a tuple of upper-case addresses"""
+    if not value:
+        return ()
+    return tuple(
+        mac.strip().upper() for mac in value.strip('[]{}').replace('"', '').split(',') if mac.strip()
+    )
+
+
+def list_site_exports(directory=SITES_DATA_DIR):
+    """Paths of the CSV exports in a directory, in name order"""
+    return [
+        os.path.join(directory, filename) for filename in sorted(os.listdir(directory))
+        if filename.lower().endswith('.csv')
+    ]
+
+
+def file_digest(path):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def changed_site_exports(directory, known):
+    """Compare the exports in a directory with their last known state
+
+    `known` maps each path to its (size, mtime_ns, sha256) and is updated in
+    place. A file is hashed only when its size or mtime moved, and reported
+    only when its content changed. Returns (changed paths, removed paths).
+    """
+    changed = []
+    paths = list_site_exports(directory)
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            state = known.get(path)
+            if state is not None and state[:2] == (stat.st_size, stat.st_mtime_ns):
+                continue
+            digest = file_digest(path)
+        except FileNotFoundError:
+            # Replaced while listing; picked up on the next check
+            continue
+        if state is None or state[2] != digest:
+            changed.append(path)
+        known[path] = (stat.st_size, stat.st_mtime_ns, digest)
+
+    removed = sorted(set(known) - set(paths))
+    for path in removed:
+        del known[path]
+    return changed, removed
+
+
+def resolve_columns(header):
+    """Header used for each field of SITE_EXPORT_COLUMNS in a file, or None if absent"""
+    present = set(header or [])
+    return [next((column for column in columns if column in present), None)
+            for columns in SITE_EXPORT_COLUMNS.values()]
+
+
+def read_site_export(path, exported_at=None):
+    """Parse one site export into DeviceRecord argument tuples
+
+    Workers return plain tuples, which are cheaper to send back than records.
+    """
+    rows = []
+    with open(path, newline='', encoding='utf-8', errors='replace') as f:
+        reader = csv.DictReader(f)
+        columns = resolve_columns(reader.fieldnames)
+        for index, row in enumerate(reader, start=1):
+            fields = tuple((row.get(column) or '').strip() or None if column else None for column in columns)
+            rows.append((index, fields, parse_last_seen(row.get(LAST_SEEN_COLUMN), exported_at),
+                         parse_mac_addresses(row.get(MAC_COLUMN))))
+    return rows
+
+
+def _records(path, rows):
+    """Build DeviceRecords from the tuples of read_site_export"""
+    source = os.path.basename(path)
+    for index, fields, last_seen, mac_addresses in rows:
+        values = dict(zip(SITE_EXPORT_COLUMNS, fields))
+        yield DeviceRecord(id=index, source_table=source, last_seen=last_seen,
+                           mac_addresses=mac_addresses, **values)
+
+
+def read_site_exports(paths, workers=INGEST_WORKERS):
+    """Yield (path, DeviceRecords of that file) for each path, in order
+
+    Each record's source_table is its file name and its id the row number
+    within that file.
+    """
+    exported_at = datetime.now(timezone.utc)
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, _records(path, read_site_export(path, exported_at))
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for path, rows in zip(paths, executor.map(read_site_export, paths, [exported_at] * len(paths))):
+            yield path, _records(path, rows)
+
+
+def stream_site_exports(directory=SITES_DATA_DIR, workers=INGEST_WORKERS):
+    """Yield DeviceRecords from every site export in a directory"""
+    paths = list_site_exports(directory)
+    print(f"Reading {len(paths)} site exports from {directory}")
+    for _, records in read_site_exports(paths, workers):
+        yield from records
@@ -0,0 +1,160 @@
+"""Tests for the CPU knowledge cache and lookups, against a local stub search server"""
+
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import cpu_knowledge
+from cpu_knowledge import CpuKnowledgeCache, lookup_cpu, lookup_cpus, normalize_cpu_model, search_query
+
+SERVER_PAGE = "<html><body>Xeon server CPU for the datacenter and enterprise rack</body></html>"
+
+
+class StubSearch:
+    """Search endpoint answering each CPU key with scripted statuses, then SERVER_PAGE"""
+
+    def __init__(self):
+        self.statuses = {}
+        self.requests = Counter()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = parse_qs(urlparse(self.path).query)['q'][0]
+                cpu_key = query[:-len(search_query(''))]
+                stub.requests[cpu_key] += 1
+                scripted = stub.statuses.get(cpu_key)
+                status = scripted.pop(0) if scripted else 200
+                body = (SERVER_PAGE if status == 200 else 'error').encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/search"
+
+
+@pytest.fixture
+def stub_search(monkeypatch):
+    stub = StubSearch()
+    thread = threading.Thread(target=stub.server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(cpu_knowledge, 'CPU_LOOKUP_URL', stub.url)
+    yield stub
+    stub.server.shutdown()
+    stub.server.server_close()
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controllable time.time for the cache's timestamps"""
+    now = [1_000_000.0]
+    monkeypatch.setattr(cpu_knowledge.time, 'time', lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = CpuKnowledgeCache(str(tmp_path / 'cpu_cache.sqlite3'), ttl=3600, max_entries=100)
+    yield cache
+    cache.close()
+
+
+SERVER_RESULT = {'category': 'Server-Physical', 'confidence': 1.0, 'counts': {'Server-Physical': 4}}
+
+
+def test_normalize_cpu_model_drops_decorations():
+    assert normalize_cpu_model('Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz') == 'intel xeon gold 6248r'
+    assert normalize_cpu_model('Intel(R) Core(TM) i5-4570 CPU @ 3.20GHz') == 'intel core i5-4570'
+    assert normalize_cpu_model('Intel Xeon E5-2670 (4 vCPUs)') == 'intel xeon e5-2670'
+    assert normalize_cpu_model('  AMD   EPYC 7763 64-Core Processor ') == 'amd epyc 7763 64-core'
+
+
+def test_normalize_cpu_model_empty():
+    assert normalize_cpu_model(None) == ''
+    assert normalize_cpu_model('') == ''
+
+
+def test_cache_entries_expire_after_ttl(tmp_path, clock):
+    cache = CpuKnowledgeCache(str(tmp_path / 'cpu_cache.sqlite3'), ttl=60)
+    cache.put('intel xeon gold 6248r', SERVER_RESULT)
+    clock[0] += 59
+    assert cache.get('intel xeon gold 6248r') == SERVER_RESULT
+    clock[0] += 2
+    assert cache.get('intel xeon gold 6248r') is None
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.close()
+
+
+def test_cache_persists_across_instances(tmp_path):
+    filename = str(tmp_path / 'cpu_cache.sqlite3')
+    cache = CpuKnowledgeCache(filename)
+    cache.put('intel xeon gold 6248r', SERVER_RESULT)
+    cache.close()
+    reopened = CpuKnowledgeCache(filename)
+    assert reopened.get('intel xeon gold 6248r') == SERVER_RESULT
+    reopened.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path, clock):
+    cache = CpuKnowledgeCache(str(tmp_path / 'cpu_cache.sqlite3'), max_entries=2)
+    cache.put('a', SERVER_RESULT)
+    clock[0] += 1
+    cache.put('b', SERVER_RESULT)
+    clock[0] += 1
+    assert cache.get('a') is not None
+    clock[0] += 1
+    cache.put('c', SERVER_RESULT)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    cache.close()
+
+
+def test_lookup_cpu_fetches_only_on_miss(stub_search, cache):
+    first = lookup_cpu('Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz', cache=cache)
+    second = lookup_cpu('Intel Xeon Gold 6248R', cache=cache)
+    assert first['category'] == 'Server-Physical'
+    assert second == first
+    assert stub_search.requests == {'intel xeon gold 6248r': 1}
+
+
+def test_lookup_cpu_does_not_cache_404(stub_search, cache):
+    stub_search.statuses['mystery chip 9000'] = [404]
+    assert lookup_cpu('Mystery Chip 9000', cache=cache)['category'] == 'Unknown'
+    assert cache.get('mystery chip 9000') is None
+    assert lookup_cpu('Mystery Chip 9000', cache=cache)['category'] == 'Server-Physical'
+    assert stub_search.requests['mystery chip 9000'] == 2
+
+
+def test_lookup_cpus_deduplicates_and_uses_cache(stub_search, cache):
+    cache.put('intel xeon gold 6248r', SERVER_RESULT)
+    results = lookup_cpus(['Intel(R) Xeon(R) Gold 6248R CPU @ 3.00GHz', 'AMD EPYC 7763',
+                           'AMD EPYC 7763 Processor', ''], cache=cache)
+    assert set(results) == {'intel xeon gold 6248r', 'amd epyc 7763'}
+    assert results['intel xeon gold 6248r'] == SERVER_RESULT
+    assert stub_search.requests == {'amd epyc 7763': 1}
+    assert cache.get('amd epyc 7763')['category'] == 'Server-Physical'
+
+
+@pytest.mark.parametrize('status', [429, 503])
+def test_lookup_cpus_retries_rate_limits_and_server_errors(stub_search, cache, status):
+    stub_search.statuses['amd epyc 7763'] = [status]
+    results = lookup_cpus(['AMD EPYC 7763'], cache=cache)
+    assert results['amd epyc 7763']['category'] == 'Server-Physical'
+    assert stub_search.requests['amd epyc 7763'] == 2
+
+
+def test_lookup_cpus_does_not_cache_or_retry_404(stub_search, cache):
+    stub_search.statuses['mystery chip 9000'] = [404]
+    assert lookup_cpus(['Mystery Chip 9000'], cache=cache) == {}
+    assert stub_search.requests['mystery chip 9000'] == 1
+    assert cache.get('mystery chip 9000') is None